@@ -0,0 +1,40 @@
+from django.core.cache import caches
+from articles.models import Section
+
+SECTIONS_VERSION_KEY = "sections:version"
+SECTIONS_TIMEOUT = 60 * 60 * 24
+
+
+def shared_cache():
+    """
+    Cache shared by the web, Celery and management command processes.
+    """
+    return caches["shared"]
+
+
+def sections_cache_version() -> int:
+    return shared_cache().get_or_set(SECTIONS_VERSION_KEY, 1, timeout=None)
+
+
+def bump_sections_cache_version():
+    """
+    Invalidate everything cached from the sections collection.
+    """
+    cache = shared_cache()
+    try:
+        cache.incr(SECTIONS_VERSION_KEY)
+    except ValueError:
+        # Key missing or evicted: any version other than the default works
+        cache.set(SECTIONS_VERSION_KEY, 2, timeout=None)
+
+
+def get_sections_map() -> dict[str, Section]:
+    """
+    All sections by section_id, cached until the sections change.
+    """
+    key = f"sections:map:{sections_cache_version()}"
+    return shared_cache().get_or_set(
+        key,
+        lambda: {s.section_id: s for s in Section.objects.all()},
+        timeout=SECTIONS_TIMEOUT,
+    )
@@ -0,0 +1,64 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, Iterator
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+# Kept free of Django imports: the pool's worker processes import this
+# module (they are spawned, not forked) without setting Django up
+
+CHUNK_SIZE = 512
+CHUNK_OVERLAP = 50
+
+
+def build_text_splitter(encoding_name: str) -> RecursiveCharacterTextSplitter:
+    return RecursiveCharacterTextSplitter.from_tiktoken_encoder(
+        encoding_name=encoding_name,
+        chunk_size=CHUNK_SIZE,
+        chunk_overlap=CHUNK_OVERLAP,
+    )
+
+
+_splitter = None
+
+
+def _init_worker(encoding_name: str):
+    global _splitter
+    # Loads the tiktoken encoding once per worker, not once per task
+    _splitter = build_text_splitter(encoding_name)
+
+
+def _split_text(text: str) -> list[str]:
+    return _splitter.split_text(text)
+
+
+class ChunkingPool:
+    """
+    Splits texts into chunks on a pool of worker processes, each with its
+    own preloaded splitter, so tokenization runs on several cores and off
+    the process that embeds and writes.
+
+    Workers are spawned rather than forked: the parent holds threads and
+    Mongo connections that must not be copied into them.
+    """
+
+    def __init__(self, workers: int, encoding_name: str):
+        self.workers = workers
+        self._executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(encoding_name,),
+        )
+
+    def split(self, texts: Iterable[str]) -> Iterator[list[str]]:
+        """
+        The chunks of each text, yielded in the order of `texts` as soon as
+        they are ready.
+        """
+        texts = list(texts)
+        # A few tasks per worker keeps them all busy without per-text IPC
+        chunksize = max(1, len(texts) // (self.workers * 4))
+        return self._executor.map(_split_text, texts, chunksize=chunksize)
+
+    def shutdown(self):
+        self._executor.shutdown()
@@ -0,0 +1,193 @@
+import hashlib
+import logging
+import re
+from typing import NamedTuple
+import numpy as np
+from django.conf import settings
+from django.db import IntegrityError
+from articles.models import Chunk, ChunkFingerprint
+from articles.vectors import CLEARED_VECTORS, VECTOR_FIELDS, VectorSlot, has_vectors, write_slots
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+SHINGLE_WORDS = 5
+# MinHash signature of BANDS * ROWS values; texts sharing a band are
+# near-duplicate candidates, about 99% likely from a Jaccard similarity of 0.9
+BANDS = 8
+ROWS = 8
+
+_rng = np.random.default_rng(0)
+# Multiply-shift hashing: one (odd a, b) pair per signature value
+_A = _rng.integers(1, 2**63, size=BANDS * ROWS, dtype=np.uint64) | np.uint64(1)
+_B = _rng.integers(0, 2**63, size=BANDS * ROWS, dtype=np.uint64)
+
+
+def shingles(text: str) -> set[str]:
+    words = re.findall(r"\w+", text.lower())
+    if len(words) <= SHINGLE_WORDS:
+        return {" ".join(words)}
+    return {" ".join(words[i:i + SHINGLE_WORDS]) for i in range(len(words) - SHINGLE_WORDS + 1)}
+
+
+def jaccard(a: set[str], b: set[str]) -> float:
+    return len(a & b) / len(a | b) if a or b else 1.0
+
+
+def shingle_bands(text: str) -> list[str]:
+    """
+    Locality-sensitive keys of the text's MinHash signature: near-duplicate
+    texts share at least one of them.
+    """
+    hashes = np.array(
+        [int.from_bytes(hashlib.blake2b(s.encode(), digest_size=8).digest(), "little") for s in shingles(text)],
+        dtype=np.uint64,
+    )
+    signature = ((_A[:, None] * hashes[None, :] + _B[:, None]) >> np.uint64(32)).min(axis=1)
+    return [
+        f"{band}:{hashlib.blake2b(signature[band * ROWS:(band + 1) * ROWS].tobytes(), digest_size=8).hexdigest()}"
+        for band in range(BANDS)
+    ]
+
+
+def suppress(chunk: Chunk):
+    chunk.boilerplate = True
+    for field in VECTOR_FIELDS:
+        setattr(chunk, field, None)
+
+
+def match_fingerprints(chunks: list[Chunk]) -> dict[str, ChunkFingerprint]:
+    """
+    The fingerprint each chunk duplicates, exactly or nearly, by content hash.
+    """
+    hashes = {chunk.content_hash for chunk in chunks}
+    exact = {fp.content_hash: fp for fp in ChunkFingerprint.objects.filter(content_hash__in=hashes)}
+
+    unmatched = [chunk for chunk in chunks if chunk.content_hash not in exact]
+    bands = {chunk.content_hash: shingle_bands(chunk.text) for chunk in unmatched}
+    all_bands = {band for chunk_bands in bands.values() for band in chunk_bands}
+    candidates = list(ChunkFingerprint.objects.filter(shingle_bands__overlap=list(all_bands))) if all_bands else []
+
+    matches = dict(exact)
+    for chunk in unmatched:
+        chunk_bands = set(bands[chunk.content_hash])
+        chunk_shingles = shingles(chunk.text)
+        best, best_score = None, settings.EMBEDDING_NEAR_DUPLICATE_THRESHOLD
+        for fp in candidates:
+            if chunk_bands.isdisjoint(fp.shingle_bands):
+                continue
+            score = jaccard(chunk_shingles, shingles(fp.text))
+            if score >= best_score:
+                best, best_score = fp, score
+        if best is not None:
+            matches[chunk.content_hash] = best
+    return matches
+
+
+def create_fingerprints(chunks: list[Chunk]):
+    """
+    Record the chunks' texts as new fingerprints, tolerating ones recorded
+    concurrently by another worker.
+    """
+    fingerprints = {}
+    for chunk in chunks:
+        fingerprints.setdefault(
+            chunk.content_hash,
+            ChunkFingerprint(content_hash=chunk.content_hash, shingle_bands=shingle_bands(chunk.text), text=chunk.text),
+        )
+    try:
+        ChunkFingerprint.objects.bulk_create(fingerprints.values())
+    except IntegrityError:
+        for fingerprint in fingerprints.values():
+            try:
+                fingerprint.save(force_insert=True)
+            except IntegrityError:
+                continue
+
+
+class FingerprintMatch(NamedTuple):
+    """
+    Outcome of fingerprint_chunks, written by save_fingerprints.
+    """
+    to_embed: list[Chunk]
+    # Chunks whose text is recorded as a new fingerprint
+    new: list[Chunk]
+    # Fingerprints found to be boilerplate, whose stored chunks lose their vectors
+    boilerplate: set[str]
+
+
+def fingerprint_chunks(chunks: list[Chunk], slots: list[tuple[VectorSlot, str]] | None = None) -> FingerprintMatch:
+    """
+    Match chunks (with their content_hash set) against the corpus.
+
+    Each chunk's `fingerprint` is set to the content hash of the text it
+    duplicates, or to its own. A text found in EMBEDDING_BOILERPLATE_MIN_ARTICLES
+    articles is boilerplate: its chunks, stored ones included, lose their
+    embeddings and drop out of the vector indexes. Other duplicates share
+    the vectors of a stored copy having them in every slot of `slots`
+    (default: those being written).
+
+    Only reads the database: the new fingerprints and boilerplate are
+    recorded by save_fingerprints, once the chunks are about to be written.
+    """
+    if not chunks:
+        return FingerprintMatch([], [], set())
+    slots = slots or write_slots()
+
+    matches = match_fingerprints(chunks)
+    for chunk in chunks:
+        fingerprint = matches.get(chunk.content_hash)
+        chunk.fingerprint = fingerprint.content_hash if fingerprint else chunk.content_hash
+
+    matched = {fp.content_hash: fp for fp in matches.values()}
+    copies = {}  # live chunks per duplicated fingerprint, bounded by the boilerplate threshold
+    for chunk in Chunk.objects.filter(
+        fingerprint__in=[h for h, fp in matched.items() if not fp.boilerplate]
+    ).only("article_id", "fingerprint", *VECTOR_FIELDS):
+        copies.setdefault(chunk.fingerprint, []).append(chunk)
+
+    # Articles each text is found in, stored copies and this batch (where a
+    # text not seen before may already be repeated) alike
+    articles = {}
+    for chunk in chunks:
+        articles.setdefault(chunk.fingerprint, set()).add(chunk.article_id)
+    for h, stored in copies.items():
+        articles[h].update(c.article_id for c in stored)
+
+    boilerplate = {h for h, fp in matched.items() if fp.boilerplate}
+    found = set()
+    for h, article_ids in articles.items():
+        if h in boilerplate:
+            continue
+        if len(article_ids) >= settings.EMBEDDING_BOILERPLATE_MIN_ARTICLES:
+            found.add(h)
+            logger.info(f"Chunk text {h[:12]} found in {len(article_ids)} articles, suppressed as boilerplate")
+    boilerplate |= found
+
+    to_embed = []
+    for chunk in chunks:
+        if chunk.fingerprint in boilerplate:
+            suppress(chunk)
+        elif not has_vectors(chunk, slots):
+            source = next((c for c in copies.get(chunk.fingerprint, []) if has_vectors(c, slots)), None)
+            if source is not None:
+                for slot, _ in slots:
+                    slot.copy(source, chunk)
+            else:
+                to_embed.append(chunk)
+
+    if len(to_embed) < len(chunks):
+        logger.info(f"{len(chunks) - len(to_embed)} of {len(chunks)} chunks are duplicates, not embedded")
+    return FingerprintMatch(to_embed, [chunk for chunk in chunks if chunk.content_hash not in matches], found)
+
+
+def save_fingerprints(match: FingerprintMatch, article_ids: set | None = None):
+    """
+    Record the new fingerprints of a fingerprint_chunks match (only those of
+    `article_ids`' chunks, if given) and suppress the stored copies of new
+    boilerplate.
+    """
+    create_fingerprints([c for c in match.new if article_ids is None or c.article_id in article_ids])
+    for h in match.boilerplate:
+        ChunkFingerprint.objects.filter(content_hash=h).update(boilerplate=True)
+        Chunk.objects.filter(fingerprint=h).update(boilerplate=True, **CLEARED_VECTORS)
@@ -0,0 +1,450 @@
+from articles.models import Article, Chunk, content_hash
+import functools
+import logging
+import numpy as np
+from typing import Callable
+from django.conf import settings
+from django.utils import timezone
+from articles.dedupe import FingerprintMatch, fingerprint_chunks, save_fingerprints
+from articles.leases import ArticleLeases
+from articles.pipeline import run_pipeline
+from articles.chunking import ChunkingPool, build_text_splitter
+from articles.vectors import SLOTS, VECTOR_FIELDS, VectorSlot, current_version, cut_over, has_vectors, write_slots
+from utils.embeddings import TOKEN_ENCODING, embed
+from langchain_core.documents import Document
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+
+@functools.cache
+def get_text_splitter():
+    # Built on first use: tiktoken may download its encoding
+    return build_text_splitter(TOKEN_ENCODING)
+
+
+@functools.cache
+def get_chunking_pool() -> ChunkingPool | None:
+    """
+    Process pool splitting article bodies, started on first use;
+    None when EMBEDDING_CHUNK_WORKERS leaves splitting in-process.
+    """
+    if settings.EMBEDDING_CHUNK_WORKERS <= 1:
+        return None
+    return ChunkingPool(settings.EMBEDDING_CHUNK_WORKERS, TOKEN_ENCODING)
+
+
+def split_texts(texts: list[str], pool: ChunkingPool | None = None):
+    """
+    The chunks of each text, in order, split on `pool` when given.
+    """
+    if pool is None:
+        return map(get_text_splitter().split_text, texts)
+    return pool.split(texts)
+
+
+def split_article_chunks(articles: list[Article]) -> list[Document]:
+    """
+    Split the articles into chunk Documents carrying article_id and chunk_index metadata.
+    """
+    chunk_texts = split_texts([article.body_text or "" for article in articles], get_chunking_pool())
+    return [
+        Document(page_content=text, metadata={"article_id": article.id, "chunk_index": idx})
+        for article, texts in zip(articles, chunk_texts)
+        for idx, text in enumerate(texts)
+    ]
+
+
+def build_chunks(chunked_documents: list[Document]) -> list[Chunk]:
+    """
+    Chunk instances (without embeddings) using metadata from Documents.
+    """
+    return [
+        Chunk(
+            article_id=doc.metadata["article_id"],
+            chunk_index=doc.metadata["chunk_index"],
+            text=doc.page_content,
+            content_hash=content_hash(doc.page_content),
+        )
+        for doc in chunked_documents
+    ]
+
+
+def embed_chunks(chunks: list[Chunk], slots: list[tuple[VectorSlot, str]] | None = None):
+    """
+    Embed the chunks' texts in a single batch per model and set their
+    vectors in `slots` (default: every slot being written, see articles.vectors).
+    A text repeated in the batch (e.g. a footer new to the corpus) is
+    embedded once.
+    """
+    if not chunks:
+        return
+    texts = list(dict.fromkeys(chunk.text for chunk in chunks))
+    for slot, model in slots or write_slots():
+        embeddings = dict(zip(texts, embed(texts, model)))
+        for chunk in chunks:
+            slot.set(chunk, embeddings[chunk.text], model)
+
+
+def embed_chunk_documents(chunked_documents: list[Document]) -> list[Chunk]:
+    """
+    Embed chunk Documents in a single batch and return Chunk instances.
+    Does NOT write to the database.
+    """
+    if not chunked_documents:
+        logger.info("No chunks produced for this batch. Skipping.")
+        return []
+
+    chunks = build_chunks(chunked_documents)
+    embed_chunks(chunks)
+    return chunks
+
+
+def diff_article_chunks(
+    articles: list[Article], chunked_documents: list[Document]
+) -> tuple[list[Chunk], list[Chunk], FingerprintMatch | None]:
+    """
+    Compare the articles' chunk Documents with their stored chunks, by text
+    hash, and embed only the new or changed ones.
+
+    Returns (chunks to insert, stored chunks to keep, fingerprint match).
+    A stored chunk with
+    the same text at the same index is kept as it is; one whose text moved
+    to another index is re-inserted there with its embedding. Stored chunks
+    are only reused if they have vectors of the current models in every
+    slot being written.
+    With EMBEDDING_DEDUPE_CHUNKS, the other chunks are first matched against
+    the rest of the corpus (see fingerprint_chunks): duplicates share an
+    embedding, boilerplate is not embedded. The match (None without
+    deduplication) must be saved with save_fingerprints when the chunks
+    are written.
+    Does NOT write to the database.
+    """
+    slots = write_slots()
+    stored = {}
+    for chunk in Chunk.objects.filter(article__in=articles).only(
+        "article_id", "chunk_index", "text", "content_hash", "fingerprint", "boilerplate", *VECTOR_FIELDS
+    ):
+        if chunk.boilerplate or has_vectors(chunk, slots):
+            stored.setdefault((chunk.article_id, chunk.content_hash), []).append(chunk)
+
+    kept, moved, changed = [], [], []
+    for doc in chunked_documents:
+        article_id, chunk_index = doc.metadata["article_id"], doc.metadata["chunk_index"]
+        text_hash = content_hash(doc.page_content)
+        candidates = stored.get((article_id, text_hash))
+        if not candidates:
+            changed.append(doc)
+            continue
+        # Prefer the chunk that stayed at the same index
+        match = next((c for c in candidates if c.chunk_index == chunk_index), candidates[0])
+        candidates.remove(match)
+        if match.chunk_index == chunk_index:
+            kept.append(match)
+        else:
+            chunk = Chunk(
+                article_id=article_id,
+                chunk_index=chunk_index,
+                text=doc.page_content,
+                content_hash=text_hash,
+                fingerprint=match.fingerprint,
+                boilerplate=match.boilerplate,
+            )
+            for slot in SLOTS.values():
+                slot.copy(match, chunk)
+            moved.append(chunk)
+
+    if kept or moved:
+        logger.info(f"Reusing {len(kept) + len(moved)} chunk embeddings, embedding {len(changed)} chunks")
+    new = build_chunks(changed)
+    match = fingerprint_chunks(new, slots) if settings.EMBEDDING_DEDUPE_CHUNKS else None
+    embed_chunks(match.to_embed if match else new, slots)
+    return moved + new, kept, match
+
+
+def embed_article_chunks(articles: list[Article]):
+    """
+    Split all articles into chunks, generate embeddings in a single batch,
+    and return Chunk instances. Does NOT write to the database.
+    """
+    try:
+        chunks = embed_chunk_documents(split_article_chunks(articles))
+    except Exception as e:
+        logger.error(f"Error embedding batch: {e}")
+        return []
+    if chunks:
+        logger.info(f"Prepared {len(chunks)} chunks for {len(articles)} articles")
+    return chunks
+
+
+def embedding_fields(slot: VectorSlot) -> list[str]:
+    return slot.fields + ["embedded_at"]
+
+
+def set_embedding(article: Article, embedding, slot: VectorSlot, model: str):
+    slot.set(article, embedding, model)
+    article.embedded_at = timezone.now()
+
+
+def pooled_embedding(chunks: list[Chunk], slot: VectorSlot = SLOTS["primary"]) -> np.ndarray:
+    """
+    Length-weighted mean of the chunks' embeddings (of `slot`), normalized.
+    """
+    vectors = np.stack([np.asarray(slot.get(chunk), dtype=np.float32) for chunk in chunks])
+    weights = np.array([len(chunk.text) for chunk in chunks], dtype=np.float32)
+    pooled = weights @ vectors / weights.sum()
+    norm = np.linalg.norm(pooled)
+    return pooled / norm if norm else pooled
+
+
+def pool_article_embeddings(
+    articles: list[Article], chunks: list[Chunk], slots: list[tuple[VectorSlot, str]] | None = None
+) -> list[Article]:
+    """
+    Set each article's embedding, in every slot of `slots` (default: those
+    being written), from its chunks' embeddings of that slot's model,
+    sparing a second (and truncated) pass of the model over the whole body.
+    Articles without such chunks (other than boilerplate) are left as they
+    are. Returns the updated ones.
+    """
+    updated = {}
+    for slot, model in slots or write_slots():
+        chunks_by_article = {}
+        for chunk in chunks:
+            if slot.get(chunk) is not None and slot.model(chunk) == model:
+                chunks_by_article.setdefault(chunk.article_id, []).append(chunk)
+
+        pooled = [article for article in articles if article.pk in chunks_by_article]
+        for article in pooled:
+            set_embedding(article, pooled_embedding(chunks_by_article[article.pk], slot), slot, model)
+            updated[article.pk] = article
+        if pooled:
+            Article.objects.bulk_update(pooled, embedding_fields(slot))
+    return list(updated.values())
+
+
+def chunking_backlog():
+    """
+    Articles not chunked yet: a range query on the chunked_at index.
+    """
+    return Article.objects.filter(chunked_at__isnull=True)
+
+
+def embedding_backlog(pool: bool):
+    """
+    Articles without an embedding; when pooling, only those already chunked.
+    """
+    articles = Article.objects.filter(embedded_at__isnull=True)
+    if pool:
+        articles = articles.filter(chunked_at__isnull=False)
+    return articles
+
+
+def chunk_articles(
+    article_ids: list | None = None,
+    batch_size: int = 30,
+    queryset=None,
+    progress: Callable[[int], None] | None = None,
+    limit: int | None = None,
+):
+    """
+    Chunk and embed the given articles (or those of `queryset`), replacing
+    any chunks they already have.
+
+    Articles are streamed from the database while earlier batches are being
+    split, embedded and written (see run_pipeline). `progress` is called
+    with the size of every batch written.
+
+    Batches are leased (see ArticleLeases) so that several workers can run
+    on the same articles at once, each chunking its own. `limit` caps the
+    number of articles processed.
+    """
+    if queryset is None:
+        queryset = Article.objects.filter(pk__in=article_ids)
+    leases = ArticleLeases(queryset.only("id", "body_text"), "chunked_at", batch_size, limit=limit)
+
+    def split(batch):
+        return batch, split_article_chunks(batch)
+
+    def infer(item):
+        batch, documents = item
+        try:
+            return batch, diff_article_chunks(batch, documents)
+        except Exception as e:
+            # Left unchunked (and leased until the lease expires), so a later run picks the batch up again
+            logger.error(f"Error embedding batch: {e}")
+            return None
+
+    def write(item):
+        batch, (chunks, kept, match) = item
+        batch = leases.owned(batch)
+        owned_pks = {a.pk for a in batch}
+        chunks = [c for c in chunks if c.article_id in owned_pks]
+        kept = [c for c in kept if c.article_id in owned_pks]
+        if match and batch:
+            save_fingerprints(match, owned_pks)
+        # Safe to retry: every other chunk of these articles is replaced
+        Chunk.objects.filter(article__in=batch).exclude(pk__in=[c.pk for c in kept]).delete()
+        if chunks:
+            Chunk.objects.bulk_create(chunks)
+            logger.info(f"Bulk wrote {len(chunks)} chunks for {len(batch)} articles")
+        if settings.EMBEDDING_POOL_CHUNKS and (chunks or kept):
+            pool_article_embeddings(batch, kept + chunks)
+        # Articles without body text yield no chunks, they are done too
+        leases.release(batch, chunked_at=timezone.now())
+        if progress:
+            progress(len(batch))
+
+    run_pipeline(
+        leases,
+        [split, infer, write],
+        queue_size=settings.EMBEDDING_PIPELINE_QUEUE_SIZE,
+    )
+
+
+def embed_articles(
+    batch_size: int = 100,
+    article_ids: list | None = None,
+    pool: bool | None = None,
+    progress: Callable[[int], None] | None = None,
+):
+    """
+    Generates embeddings for articles that are not embedded yet,
+    or for the given articles only.
+
+    With `pool` (default: EMBEDDING_POOL_CHUNKS) they are pooled from the
+    articles' stored chunk embeddings; articles not chunked yet are skipped.
+    Otherwise the whole body text is embedded. Articles are streamed and
+    processed in overlapping stages, and leased, like in chunk_articles.
+    """
+    if pool is None:
+        pool = settings.EMBEDDING_POOL_CHUNKS
+
+    if article_ids is not None:
+        articles = Article.objects.filter(pk__in=article_ids)
+    else:
+        articles = embedding_backlog(pool)
+    articles = articles.only("id") if pool else articles.only("id", "body_text")
+    leases = ArticleLeases(articles, "embedded_at", batch_size)
+
+    logger.info("Starting embedding of articles" + (" from their chunks" if pool else ""))
+    batches = 0
+
+    def load_chunks(batch):
+        chunks = Chunk.objects.filter(article__in=batch).only("article_id", "text", *VECTOR_FIELDS)
+        return batch, list(chunks)
+
+    def infer(batch):
+        try:
+            texts = [a.body_text for a in batch]
+            return batch, [(slot, model, embed(texts, model)) for slot, model in write_slots()]
+        except Exception as e:
+            logger.error(f"Error embedding batch: {e}")
+            return None
+
+    def write(item):
+        nonlocal batches
+        batch, result = item
+        batches += 1
+        owned = leases.owned(batch)
+        owned_pks = {a.pk for a in owned}
+        if pool:
+            result = [c for c in result if c.article_id in owned_pks]
+        else:
+            keep = [a.pk in owned_pks for a in batch]
+            result = [
+                (slot, model, [e for e, k in zip(embeddings, keep) if k])
+                for slot, model, embeddings in result
+            ]
+        batch = owned
+        if pool:
+            embedded = pool_article_embeddings(batch, result)
+            if len(embedded) < len(batch):
+                # Still leased, so not picked up again before the lease expires
+                logger.info(f"{len(batch) - len(embedded)} articles have no chunks yet, skipped")
+        else:
+            for slot, model, embeddings in result:
+                for article, embedding in zip(batch, embeddings):
+                    set_embedding(article, embedding, slot, model)
+                if batch:
+                    Article.objects.bulk_update(batch, embedding_fields(slot))
+            embedded = batch
+        leases.release(embedded)
+        logger.info(f"Embedded batch {batches}")
+        if progress:
+            progress(len(batch))
+
+    run_pipeline(
+        leases,
+        [load_chunks if pool else infer, write],
+        queue_size=settings.EMBEDDING_PIPELINE_QUEUE_SIZE,
+    )
+    logger.info("Embedding process completed.")
+
+
+def migration_backlog(version):
+    """
+    Chunked articles whose vectors in the migration's target slot are
+    missing or of another model. Articles not chunked yet get both slots
+    when they are.
+    """
+    slot = SLOTS[version.target_slot]
+    return Article.objects.filter(chunked_at__isnull=False).exclude(**{slot.model_field: version.target_model})
+
+
+def migrate_embeddings(
+    batch_size: int = 50,
+    limit: int | None = None,
+    progress: Callable[[int], None] | None = None,
+) -> int:
+    """
+    Re-embed up to `limit` articles of the running migration's backlog, and
+    their chunks, with the target model into the target slot. Batches are
+    leased like in chunk_articles. Once the backlog is empty, search cuts
+    over to the target slot. Returns the number of articles processed.
+    """
+    version = current_version(refresh=True)
+    if not version.target_slot:
+        return 0
+    slot, model = SLOTS[version.target_slot], version.target_model
+    slots = [(slot, model)]
+
+    leases = ArticleLeases(migration_backlog(version).only("id", "body_text"), None, batch_size, limit=limit)
+    processed = 0
+    for batch in leases:
+        chunks = list(
+            Chunk.objects.filter(article__in=batch, boilerplate=False).only("article_id", "text", *slot.fields)
+        )
+        stale = [chunk for chunk in chunks if not has_vectors(chunk, slots)]
+        try:
+            embed_chunks(stale, slots)
+            bodies = None if settings.EMBEDDING_POOL_CHUNKS else embed([a.body_text for a in batch], model)
+        except Exception as e:
+            # Left leased, retried once the lease expires
+            logger.error(f"Error re-embedding batch: {e}")
+            continue
+
+        owned = leases.owned(batch)
+        owned_pks = {a.pk for a in owned}
+        stale = [chunk for chunk in stale if chunk.article_id in owned_pks]
+        if stale:
+            Chunk.objects.bulk_update(stale, slot.fields)
+        if bodies is None:
+            pool_article_embeddings(owned, chunks, slots)
+        else:
+            for article, embedding in zip(batch, bodies):
+                set_embedding(article, embedding, slot, model)
+            if owned:
+                Article.objects.bulk_update(owned, embedding_fields(slot))
+        batch = owned
+        # Articles without chunks have nothing to re-embed, they are done too
+        leases.release(batch, **{slot.model_field: model})
+        processed += len(batch)
+        if progress:
+            progress(len(batch))
+
+    if processed:
+        logger.info(f"Re-embedded {processed} articles with {model}")
+    if not migration_backlog(version).exists() and cut_over(version):
+        logger.info(f"Embedding migration complete, search now uses {model}")
+    return processed
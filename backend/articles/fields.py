@@ -0,0 +1,53 @@
+import json
+import numpy as np
+from bson.binary import VECTOR_SUBTYPE, Binary, BinaryVectorDtype
+from django.db import models
+from django_mongodb_backend.fields import ArrayField
+
+# Header of a BSON binary vector: dtype byte, then padding byte (0 for float32)
+FLOAT32_HEADER = BinaryVectorDtype.FLOAT32.value + b"\x00"
+
+
+class BinaryVectorField(ArrayField):
+    """
+    Float vector stored as a packed float32 BSON binary vector (subtype 9)
+    instead of an array of doubles: 4 bytes per dimension rather than ~11
+    with BSON's per-element type and index key.
+
+    Values load as float32 numpy arrays. Documents written while the field
+    was a plain ArrayField still load (see compact_embeddings). It remains an
+    ArrayField of FloatField with a size, so VectorSearchIndex accepts it and
+    Atlas indexes both representations as the same "vector" field.
+    """
+
+    def __init__(self, size=None, **kwargs):
+        kwargs.pop("base_field", None)
+        super().__init__(models.FloatField(), size=size, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        del kwargs["base_field"]
+        return name, path, args, kwargs
+
+    def get_db_prep_value(self, value, connection, prepared=False):
+        if value is None or isinstance(value, Binary):
+            return value
+        return Binary(FLOAT32_HEADER + np.asarray(value, dtype="<f4").tobytes(), subtype=VECTOR_SUBTYPE)
+
+    def from_db_value(self, value, expression, connection):
+        return self.to_python(value)
+
+    def to_python(self, value):
+        if value is None or isinstance(value, np.ndarray):
+            return value
+        if isinstance(value, Binary):
+            if bytes(value[:2]) != FLOAT32_HEADER:
+                raise ValueError("Only float32 binary vectors are supported")
+            return np.frombuffer(value, dtype="<f4", offset=2)
+        if isinstance(value, str):
+            value = json.loads(value)
+        return np.asarray(value, dtype=np.float32)
+
+    def value_to_string(self, obj):
+        value = self.value_from_object(obj)
+        return json.dumps(None if value is None else np.asarray(value).tolist())
@@ -0,0 +1,308 @@
+import ijson
+import requests
+import random
+import threading
+import time
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+from django.conf import settings
+import urllib3
+from requests.adapters import HTTPAdapter
+from urllib3.util import make_headers
+from articles.guardian_replay import ReplayAdapter
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+GUARDIAN_API_URL = "https://content.guardianapis.com"
+
+# Status codes worth retrying: rate limited or a transient server error
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class GuardianAPIError(Exception):
+    def __init__(self, message, page=None):
+        what = f"page {page}" if page is not None else "request"
+        super().__init__(f"Failed to fetch {what}: {message}")
+        self.page = page
+        self.message = message
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket shared by every request sent to the Guardian API.
+    Refills at `rate` tokens per second up to `capacity` tokens.
+    """
+
+    def __init__(self, rate: float, capacity: float = 1):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Block until a token is available, then consume it.
+        """
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(
+                    self.capacity, self._tokens + (now - self._updated_at) * self.rate
+                )
+                self._updated_at = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class RequestMetrics:
+    """
+    Thread-safe latency and outcome counters for Guardian API requests.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.requests = 0
+            self.retries = 0
+            self.failures = 0
+            self.total_latency = 0.0
+            self.max_latency = 0.0
+
+    def record(self, latency: float, retried: bool = False, failed: bool = False):
+        with self._lock:
+            self.requests += 1
+            self.retries += retried
+            self.failures += failed
+            self.total_latency += latency
+            self.max_latency = max(self.max_latency, latency)
+
+    def summary(self) -> str:
+        with self._lock:
+            avg = self.total_latency / self.requests if self.requests else 0.0
+            return (
+                f"{self.requests} requests, {self.retries} retried, {self.failures} failed, "
+                f"avg latency {avg:.3f}s, max latency {self.max_latency:.3f}s"
+            )
+
+
+def parse_streamed_response(raw, build: Callable[[dict], object]) -> dict:
+    """
+    Incrementally parse a Guardian payload from a file-like object.
+
+    Each entry of "results" is handed to `build` as soon as it has been read,
+    so only one raw result dict is alive at a time. Returns the "response"
+    object with "results" replaced by the built objects.
+    """
+    data = {"results": []}
+    builder = None
+    for prefix, event, value in ijson.parse(raw, use_float=True):
+        if builder is not None:
+            builder.event(event, value)
+            if prefix == "response.results.item" and event == "end_map":
+                data["results"].append(build(builder.value))
+                builder = None
+        elif prefix == "response.results.item" and event == "start_map":
+            builder = ijson.ObjectBuilder()
+            builder.event(event, value)
+        elif prefix.count(".") == 1 and event in ("string", "number", "boolean"):
+            data[prefix.split(".", 1)[1]] = value
+    return data
+
+
+def error_message(e: requests.RequestException) -> str:
+    """
+    Extract the Guardian error message from a failed request, if any.
+    """
+    try:
+        error_data = e.response.json() if e.response is not None else {}
+        return error_data.get("message", str(e))
+    except Exception:
+        return str(e)
+
+
+class GuardianClient:
+    """
+    Client shared by everything that calls the Guardian API.
+
+    Keeps a pooled keep-alive session, negotiates compressed responses, waits
+    for the shared rate limiter before each request and retries rate limited
+    or failed requests with jittered exponential backoff.
+    """
+
+    def __init__(
+        self,
+        api_key: str | None = None,
+        rate_limiter: TokenBucket | None = None,
+        max_retries: int | None = None,
+        backoff_base: float | None = None,
+        backoff_max: float | None = None,
+    ):
+        self.api_key = api_key or os.getenv("GUARDIAN_API_KEY")
+        self.rate_limiter = rate_limiter or TokenBucket(
+            rate=settings.GUARDIAN_RATE_LIMIT,
+            capacity=settings.GUARDIAN_RATE_BURST,
+        )
+        self.max_retries = settings.GUARDIAN_MAX_RETRIES if max_retries is None else max_retries
+        self.backoff_base = settings.GUARDIAN_BACKOFF_BASE if backoff_base is None else backoff_base
+        self.backoff_max = settings.GUARDIAN_BACKOFF_MAX if backoff_max is None else backoff_max
+        self.metrics = RequestMetrics()
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=settings.GUARDIAN_MAX_CONCURRENCY,
+        )
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        # gzip/deflate, plus brotli and zstd when their decoders are installed
+        self.session.headers.update(make_headers(accept_encoding=True))
+
+        if settings.GUARDIAN_REPLAY_DIR:
+            self.use_transport(
+                ReplayAdapter(
+                    settings.GUARDIAN_REPLAY_DIR,
+                    latency=settings.GUARDIAN_REPLAY_LATENCY,
+                    rate_limit_ratio=settings.GUARDIAN_REPLAY_RATE_LIMIT_RATIO,
+                )
+            )
+
+    def use_transport(self, adapter: HTTPAdapter | None):
+        """
+        Send API requests through `adapter` (e.g. a ReplayAdapter) instead of
+        the network, or back through a pooled network adapter if None.
+        """
+        if adapter is None:
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=settings.GUARDIAN_MAX_CONCURRENCY)
+        self.session.mount(GUARDIAN_API_URL, adapter)
+
+    def _backoff(self, attempt: int, response: requests.Response | None) -> float:
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after and retry_after.isdigit():
+            return min(float(retry_after), self.backoff_max)
+        # Full jitter: spread retries of concurrent workers apart
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def get(
+        self,
+        path: str,
+        params: dict | None = None,
+        page: int | None = None,
+        build: Callable[[dict], object] | None = None,
+    ) -> dict:
+        """
+        GET an API endpoint and return the "response" object of its payload.
+
+        If `build` is given, the results are decoded while the body streams in
+        and returned already converted by `build` (see parse_streamed_response).
+        Raises GuardianAPIError once retries are exhausted.
+        """
+        stream = build is not None and settings.GUARDIAN_STREAM_RESPONSES
+        url = f"{GUARDIAN_API_URL}/{path.lstrip('/')}"
+        params = {"api-key": self.api_key} | (params or {})
+
+        for attempt in range(self.max_retries + 1):
+            self.rate_limiter.acquire()
+            start = time.perf_counter()
+            response = None
+            try:
+                response = self.session.get(url, params=params, timeout=10, stream=stream)
+                response.raise_for_status()
+                if stream:
+                    # Let urllib3 decompress the body as we read it
+                    response.raw.decode_content = True
+                    data = parse_streamed_response(response.raw, build)
+                else:
+                    data = response.json()["response"]
+                    if build is not None:
+                        data["results"] = [build(item) for item in data["results"]]
+            except (requests.RequestException, urllib3.exceptions.HTTPError, ijson.JSONError) as e:
+                latency = time.perf_counter() - start
+                # Connection errors and bodies cut short while streaming are transient too
+                retryable = (
+                    response is None
+                    or response.status_code in RETRY_STATUSES
+                    or not isinstance(e, requests.HTTPError)
+                )
+                if response is not None:
+                    response.close()
+                if not retryable or attempt == self.max_retries:
+                    self.metrics.record(latency, failed=True)
+                    raise GuardianAPIError(error_message(e), page=page) from e
+
+                self.metrics.record(latency, retried=True)
+                delay = self._backoff(attempt, response)
+                logger.warning(
+                    f"Guardian request to /{path} failed ({error_message(e)}), "
+                    f"retrying in {delay:.1f}s (attempt {attempt + 1}/{self.max_retries})"
+                )
+                time.sleep(delay)
+                continue
+
+            latency = time.perf_counter() - start
+            self.metrics.record(latency)
+            logger.debug(f"GET /{path} took {latency:.3f}s")
+            return data
+
+    def search(self, params: dict, page: int, build: Callable[[dict], object] | None = None) -> dict:
+        logger.info(f"Requesting page {page} from Guardian API")
+        return self.get("search", params | {"page": page}, page=page, build=build)
+
+    def sections(self, params: dict | None = None) -> dict:
+        return self.get("sections", params)
+
+
+client = GuardianClient()
+
+
+def iter_search_pages(
+    params: dict,
+    max_pages: int | None,
+    concurrency: int | None = None,
+    build: Callable[[dict], object] | None = None,
+    start_page: int = 1,
+):
+    """
+    Yield (page, data) tuples in page order from `start_page` onwards (up to
+    `max_pages`, if set), with results converted by `build` if given.
+
+    Page 1 is always fetched first to learn how many pages there are; the
+    following pages are fetched concurrently, keeping at most `concurrency`
+    requests in flight. Closing the generator early cancels the pages not yet
+    requested.
+    """
+    if concurrency is None:
+        concurrency = settings.GUARDIAN_MAX_CONCURRENCY
+
+    data = client.search(params, 1, build=build)
+    total_pages = data["pages"] if max_pages is None else min(data["pages"], max_pages)
+    if start_page <= 1:
+        yield 1, data
+
+    first_page = max(start_page, 2)
+    if first_page > total_pages:
+        return
+
+    executor = ThreadPoolExecutor(max_workers=concurrency)
+    try:
+        pending = {}
+        next_page = first_page
+        for page in range(first_page, total_pages + 1):
+            # Keep a sliding window of requests ahead of the consumer
+            while next_page <= total_pages and next_page < page + concurrency:
+                pending[next_page] = executor.submit(
+                    client.search, params, next_page, build
+                )
+                next_page += 1
+            yield page, pending.pop(page).result()
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
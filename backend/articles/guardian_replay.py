@@ -0,0 +1,134 @@
+import io
+import json
+import math
+import random
+import time
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+from django.utils.dateparse import parse_datetime
+from requests.adapters import HTTPAdapter
+from urllib3 import HTTPResponse
+
+SEARCH_FIXTURE = "search.json"
+SECTIONS_FIXTURE = "sections.json"
+
+
+def record_fixtures(client, out_dir: Path, params: dict, pages: int):
+    """
+    Record live /search and /sections responses into `out_dir` for ReplayAdapter.
+    Search results of all pages are stored as one list, newest first.
+    """
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    results = []
+    for page in range(1, pages + 1):
+        data = client.search(params, page)
+        results.extend(data["results"])
+        if page >= data["pages"]:
+            break
+    with open(out_dir / SEARCH_FIXTURE, "w") as f:
+        json.dump({"results": results}, f)
+
+    with open(out_dir / SECTIONS_FIXTURE, "w") as f:
+        json.dump(client.sections(), f)
+
+    return len(results)
+
+
+class ReplayAdapter(HTTPAdapter):
+    """
+    Transport that answers Guardian API requests from recorded fixtures
+    instead of the network, mounted on the client's session.
+
+    /search pages are cut from the recorded results according to the
+    request's page, page-size, section and date parameters, so any page size
+    can be replayed. `latency` seconds are added to every response and a
+    `rate_limit_ratio` share of requests get a 429 instead.
+    """
+
+    def __init__(self, fixtures_dir, latency: float = 0.0, rate_limit_ratio: float = 0.0, seed=None):
+        super().__init__()
+        fixtures_dir = Path(fixtures_dir)
+        with open(fixtures_dir / SEARCH_FIXTURE) as f:
+            self.results = json.load(f)["results"]
+        sections_path = fixtures_dir / SECTIONS_FIXTURE
+        self.sections = None
+        if sections_path.exists():
+            with open(sections_path) as f:
+                self.sections = json.load(f)
+        self.latency = latency
+        self.rate_limit_ratio = rate_limit_ratio
+        self.random = random.Random(seed)
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        url = urlparse(request.url)
+        params = {k: v[0] for k, v in parse_qs(url.query).items()}
+
+        if self.latency:
+            time.sleep(self.latency)
+
+        if self.random.random() < self.rate_limit_ratio:
+            return self.respond(request, 429, {"message": "API rate limit exceeded"}, {"Retry-After": "0"})
+
+        endpoint = url.path.rstrip("/").rsplit("/", 1)[-1]
+        if endpoint == "search":
+            return self.search(request, params)
+        if endpoint == "sections" and self.sections is not None:
+            return self.respond(request, 200, {"response": self.sections})
+        return self.respond(request, 404, {"message": f"No fixture for {url.path}"})
+
+    def search(self, request, params):
+        date_key = "webPublicationDate"
+        if params.get("use-date") == "last-modified":
+            date_key = None  # lastModified lives under "fields"
+
+        def item_date(item):
+            value = item["fields"].get("lastModified") if date_key is None else item[date_key]
+            return parse_datetime(value)
+
+        results = self.results
+        if "section" in params:
+            results = [item for item in results if item.get("sectionId") == params["section"]]
+        if "from-date" in params:
+            from_date = parse_datetime(params["from-date"])
+            results = [item for item in results if item_date(item) >= from_date]
+        if "to-date" in params:
+            to_date = parse_datetime(params["to-date"])
+            results = [item for item in results if item_date(item) <= to_date]
+        results = sorted(results, key=item_date, reverse=params.get("order-by") != "oldest")
+
+        page = int(params.get("page", 1))
+        page_size = int(params.get("page-size", 10))
+        pages = max(math.ceil(len(results) / page_size), 1)
+        if page > pages:
+            return self.respond(
+                request, 400, {"response": {"status": "error", "message": "requested page is beyond the number of available pages"}}
+            )
+
+        start = (page - 1) * page_size
+        return self.respond(
+            request,
+            200,
+            {
+                "response": {
+                    "status": "ok",
+                    "total": len(results),
+                    "startIndex": start + 1,
+                    "pageSize": page_size,
+                    "currentPage": page,
+                    "pages": pages,
+                    "orderBy": params.get("order-by", "newest"),
+                    "results": results[start : start + page_size],
+                }
+            },
+        )
+
+    def respond(self, request, status, payload, headers=None):
+        body = json.dumps(payload).encode()
+        raw = HTTPResponse(
+            body=io.BytesIO(body),
+            headers={"Content-Type": "application/json", "Content-Length": str(len(body))} | (headers or {}),
+            status=status,
+            preload_content=False,
+        )
+        return self.build_response(request, raw)
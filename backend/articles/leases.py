@@ -0,0 +1,105 @@
+import logging
+import os
+import socket
+import uuid
+from datetime import timedelta
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from articles.models import Article
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+
+class ArticleLeases:
+    """
+    Drains a queryset of articles in leased batches, so that any number of
+    workers, on any host, can process the same backlog without picking up
+    the same articles.
+
+    A batch is leased by setting lease_owner/lease_expires_at on articles
+    whose lease is free or expired, in a single update filtered on that
+    condition: Mongo matches and modifies each document atomically, so of
+    two workers racing for an article only one gets it. Articles whose
+    `done_field` was set since this run started are not leased again, which
+    makes any queryset (the backlog, given ids, all articles) drain. Without
+    a `done_field`, processing must take articles out of the queryset.
+
+    Articles that fail are not released: their lease expires after
+    EMBEDDING_LEASE_SECONDS and they are retried then, as are those of a
+    crashed worker.
+    """
+
+    def __init__(self, queryset, done_field: str | None, batch_size: int, limit: int | None = None, seconds: int | None = None):
+        self.queryset = queryset
+        self.done_field = done_field
+        self.batch_size = batch_size
+        self.limit = limit
+        self.seconds = seconds or settings.EMBEDDING_LEASE_SECONDS
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.started = timezone.now()
+        self.leased = 0
+
+    def pending(self):
+        now = timezone.now()
+        pending = self.queryset.filter(Q(lease_expires_at__isnull=True) | Q(lease_expires_at__lte=now))
+        if self.done_field:
+            pending = pending.filter(
+                Q(**{f"{self.done_field}__isnull": True}) | Q(**{f"{self.done_field}__lt": self.started})
+            )
+        return pending
+
+    def acquire(self) -> list[Article] | None:
+        """
+        Lease the next batch. Returns None once nothing is left to lease,
+        and possibly an empty list when other workers won every article.
+        """
+        size = self.batch_size
+        if self.limit is not None:
+            size = min(size, self.limit - self.leased)
+            if size <= 0:
+                return None
+
+        candidates = list(self.pending().values_list("pk", flat=True)[:size])
+        if not candidates:
+            return None
+
+        # Same conditions as pending(): an article processed and released by
+        # another worker since the candidates were read is not leased again
+        self.pending().filter(pk__in=candidates).update(
+            lease_owner=self.owner, lease_expires_at=timezone.now() + timedelta(seconds=self.seconds)
+        )
+
+        batch = list(self.queryset.filter(pk__in=candidates, lease_owner=self.owner))
+        self.leased += len(batch)
+        if len(batch) < len(candidates):
+            logger.info(f"{len(candidates) - len(batch)} articles were leased by another worker")
+        return batch
+
+    def __iter__(self):
+        while (batch := self.acquire()) is not None:
+            if batch:
+                yield batch
+
+    def owned(self, articles: list[Article]) -> list[Article]:
+        """
+        The articles still leased to this run: an article whose lease expired
+        meanwhile may have been taken over, and must not be written.
+        """
+        owned_pks = set(
+            Article.objects.filter(
+                pk__in=[a.pk for a in articles], lease_owner=self.owner
+            ).values_list("pk", flat=True)
+        )
+        if len(owned_pks) < len(articles):
+            logger.warning(f"Lost the lease on {len(articles) - len(owned_pks)} articles, skipping them")
+        return [a for a in articles if a.pk in owned_pks]
+
+    def release(self, articles: list[Article], **fields):
+        """
+        Release the lease on `articles`, updating `fields` at the same time.
+        """
+        Article.objects.filter(pk__in=[a.pk for a in articles], lease_owner=self.owner).update(
+            lease_owner=None, lease_expires_at=None, **fields
+        )
@@ -0,0 +1,238 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta, timezone
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from tqdm import tqdm
+from articles.guardian import GuardianAPIError, client as guardian_client, iter_search_pages
+from articles.models import Article, IngestCheckpoint, IngestStatus, Section
+from articles.tasks import PAGE_SIZE, SHOW_FIELDS, TYPE, dispatch_embedding, save_new_articles
+
+DATE_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+
+
+def split_windows(from_date: datetime, to_date: datetime, window: timedelta):
+    """
+    Split [from_date, to_date) into consecutive (start, end) windows,
+    `end` being inclusive and one second before the next window starts.
+    """
+    start = from_date
+    while start < to_date:
+        end = min(start + window, to_date)
+        yield start, end - timedelta(seconds=1)
+        start = end
+
+
+def backfill_window(
+    start: datetime,
+    end: datetime,
+    section: str | None = None,
+    page_size: int = PAGE_SIZE,
+    restart: bool = False,
+    embed: bool = True,
+) -> dict:
+    """
+    Fetch every article published in [start, end] (optionally in one section).
+    Progress is checkpointed per page, so a window that was interrupted
+    resumes where it stopped and a completed window is skipped.
+    """
+    name = f"backfill:{section or 'all'}:{start.strftime(DATE_FORMAT)}:{end.strftime(DATE_FORMAT)}"
+    stats = {"window": name, "pages": 0, "saved": 0, "seconds": 0.0, "status": "skipped"}
+
+    try:
+        checkpoint, created = IngestCheckpoint.objects.get_or_create(name=name)
+        if not created and not restart and checkpoint.status == IngestStatus.COMPLETED:
+            return stats
+
+        if not restart and checkpoint.resumable:
+            start_page = checkpoint.page + 1
+            page_size = checkpoint.page_size
+            checkpoint.resume()
+        else:
+            start_page = 1
+            checkpoint.start_run(start, page_size)
+
+        params = {
+            "show-fields": SHOW_FIELDS,
+            "show-tags": "keyword,contributor",
+            "page-size": page_size,
+            "order-by": "oldest",
+            "type": TYPE,
+            "from-date": start.strftime(DATE_FORMAT),
+            "to-date": end.strftime(DATE_FORMAT),
+        }
+        if section:
+            params["section"] = section
+
+        began = time.perf_counter()
+        # Windows run in parallel already, page through each one sequentially
+        pages = iter_search_pages(
+            params,
+            max_pages=None,
+            concurrency=1,
+            build=Article.from_guardian_result,
+            start_page=start_page,
+        )
+        try:
+            for page, data in pages:
+                results = data["results"]
+                existing_ids = set(
+                    Article.objects.filter(
+                        guardian_id__in=[a.guardian_id for a in results]
+                    ).values_list("guardian_id", flat=True)
+                )
+                new_articles = [
+                    a for a in results
+                    if a.guardian_id not in existing_ids and (a.body_text or "").strip()
+                ]
+                if new_articles:
+                    new_articles = save_new_articles(new_articles)
+                    stats["saved"] += len(new_articles)
+                    if embed and new_articles:
+                        dispatch_embedding([a.pk for a in new_articles])
+
+                stats["pages"] += 1
+                checkpoint.record_page(
+                    page, max(filter(None, (a.first_publication_date for a in results)), default=None)
+                )
+        except GuardianAPIError:
+            checkpoint.fail()
+            stats["status"] = "failed"
+            raise
+        finally:
+            pages.close()
+            stats["seconds"] = time.perf_counter() - began
+
+        checkpoint.complete()
+        stats["status"] = "completed"
+        return stats
+    finally:
+        # Each worker thread opened its own database connection
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = "Backfill Guardian articles over a date range, fetching date windows in parallel"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--from-date",
+            required=True,
+            help="Start of the range (YYYY-MM-DD or ISO datetime, UTC)",
+        )
+        parser.add_argument(
+            "--to-date",
+            default=None,
+            help="End of the range, exclusive (defaults to the start of the current hour)",
+        )
+        parser.add_argument(
+            "--window-hours",
+            type=int,
+            default=24,
+            help="Size of each date window in hours",
+        )
+        parser.add_argument(
+            "--sections",
+            default=None,
+            help="Also split each window by section: a comma-separated list of section ids, or 'all'",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=4,
+            help="Number of windows fetched in parallel (all share the Guardian rate limit)",
+        )
+        parser.add_argument(
+            "--page-size",
+            type=int,
+            default=PAGE_SIZE,
+            help="Number of articles to fetch per page",
+        )
+        parser.add_argument(
+            "--skip-embedding",
+            action="store_true",
+            help="Do not queue chunk and embedding tasks for the fetched articles",
+        )
+        parser.add_argument(
+            "--restart",
+            action="store_true",
+            help="Fetch windows again even if a previous backfill completed them",
+        )
+
+    def parse_date(self, value):
+        try:
+            date = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        except ValueError:
+            raise CommandError(f"Invalid date: {value}")
+        return date if date.tzinfo else date.replace(tzinfo=timezone.utc)
+
+    def handle(self, *args, **options):
+        from_date = self.parse_date(options["from_date"])
+        to_date = (
+            self.parse_date(options["to_date"])
+            if options["to_date"]
+            # Whole hours keep window names, and so their checkpoints, stable across reruns
+            else datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0)
+        )
+        if from_date >= to_date:
+            raise CommandError("--from-date must be before --to-date")
+
+        sections = [None]
+        if options["sections"] == "all":
+            sections = list(Section.objects.values_list("section_id", flat=True))
+        elif options["sections"]:
+            sections = [s.strip() for s in options["sections"].split(",") if s.strip()]
+
+        windows = [
+            (start, end, section)
+            for start, end in split_windows(
+                from_date, to_date, timedelta(hours=options["window_hours"])
+            )
+            for section in sections
+        ]
+
+        tqdm.write(
+            f"Backfilling {from_date.isoformat()} to {to_date.isoformat()} in {len(windows)} windows "
+            f"({options['workers']} workers, page size {options['page_size']})"
+        )
+
+        began = time.perf_counter()
+        total_saved = 0
+        failed = 0
+        with ThreadPoolExecutor(max_workers=options["workers"]) as executor:
+            futures = [
+                executor.submit(
+                    backfill_window,
+                    start,
+                    end,
+                    section,
+                    options["page_size"],
+                    options["restart"],
+                    not options["skip_embedding"],
+                )
+                for start, end, section in windows
+            ]
+            for future in tqdm(as_completed(futures), total=len(futures), unit="window"):
+                try:
+                    stats = future.result()
+                except Exception as e:
+                    failed += 1
+                    tqdm.write(f"Window failed, rerun to resume it: {e}")
+                    continue
+
+                total_saved += stats["saved"]
+                if stats["status"] == "skipped":
+                    tqdm.write(f"{stats['window']}: already completed, skipped")
+                    continue
+                rate = stats["saved"] / stats["seconds"] if stats["seconds"] else 0.0
+                tqdm.write(
+                    f"{stats['window']}: {stats['pages']} pages, {stats['saved']} new articles "
+                    f"in {stats['seconds']:.1f}s ({rate:.1f} articles/s)"
+                )
+
+        elapsed = time.perf_counter() - began
+        tqdm.write(
+            f"Backfill finished: {total_saved} new articles in {elapsed:.1f}s "
+            f"({total_saved / elapsed if elapsed else 0.0:.1f} articles/s), {failed} windows failed"
+        )
+        tqdm.write(f"Guardian API: {guardian_client.metrics.summary()}")
@@ -0,0 +1,72 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from articles.chunking import ChunkingPool
+from articles.embedding import get_text_splitter, split_texts
+from articles.models import Article
+from utils.embeddings import TOKEN_ENCODING
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark splitting article bodies into chunks, in-process and on process pools "
+        "of several sizes. Nothing is embedded or written."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--articles",
+            type=int,
+            default=1000,
+            help="Number of (most recent) articles to split",
+        )
+        parser.add_argument(
+            "--workers",
+            default="0,2,4",
+            help="Comma-separated pool sizes to benchmark, 0 splits in-process",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=30,
+            help="Articles handed to the splitter at once, as in embed_article_chunks",
+        )
+
+    def handle(self, *args, **options):
+        workers = [int(w) for w in options["workers"].split(",")]
+        batch_size = options["batch_size"]
+        texts = list(
+            Article.objects.exclude(body_text=None)
+            .order_by("-first_publication_date")
+            .values_list("body_text", flat=True)[: options["articles"]]
+        )
+        if not texts:
+            raise CommandError("No articles to split")
+        batches = [texts[i:i + batch_size] for i in range(0, len(texts), batch_size)]
+
+        # Not part of the timings: tiktoken may download its encoding
+        get_text_splitter()
+
+        self.stdout.write(
+            f"{'workers':>7} {'articles':>8} {'chunks':>7} {'startup s':>9} {'seconds':>8} "
+            f"{'art/s':>8} {'chunks/s':>9}"
+        )
+        for count in workers:
+            pool = None
+            startup = 0.0
+            if count > 1:
+                start = time.perf_counter()
+                pool = ChunkingPool(count, TOKEN_ENCODING)
+                # Wait for the workers to spawn and load their splitter
+                list(pool.split(["warm up"] * count))
+                startup = time.perf_counter() - start
+
+            start = time.perf_counter()
+            chunks = sum(len(c) for batch in batches for c in split_texts(batch, pool))
+            seconds = time.perf_counter() - start
+            if pool:
+                pool.shutdown()
+
+            self.stdout.write(
+                f"{count:>7} {len(texts):>8} {chunks:>7} {startup:>9.2f} {seconds:>8.2f} "
+                f"{len(texts) / seconds:>8.1f} {chunks / seconds:>9.1f}"
+            )
@@ -0,0 +1,203 @@
+import json
+import math
+import resource
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_datetime
+from pymongo import monitoring
+from articles.guardian import TokenBucket, client as guardian_client
+from articles.guardian_replay import SEARCH_FIXTURE, ReplayAdapter, record_fixtures
+from articles.models import Article, IngestCheckpoint
+from articles.tasks import PAGE_SIZE, SHOW_FIELDS, TYPE, fetch_guardian_articles
+
+BENCHMARK_CHECKPOINT = "benchmark"
+WRITE_COMMANDS = {"insert", "update", "delete"}
+
+
+class WriteTimer(monitoring.CommandListener):
+    """
+    Sums the server time spent on Mongo write commands.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.seconds = 0.0
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        if event.command_name in WRITE_COMMANDS:
+            with self._lock:
+                self.seconds += event.duration_micros / 1e6
+
+    def failed(self, event):
+        self.succeeded(event)
+
+
+# Must be registered before the first MongoClient is created
+write_timer = WriteTimer()
+monitoring.register(write_timer)
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark fetch_guardian_articles against recorded Guardian responses. "
+        "Deletes the recorded articles (with their chunks and bookmarks) from the database before "
+        "each run, so it refuses to run without --yes: use a development database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--fixtures",
+            default=str(settings.BASE_DIR / ".var" / "guardian-fixtures"),
+            help="Directory holding the recorded responses",
+        )
+        parser.add_argument(
+            "--record-pages",
+            type=int,
+            default=None,
+            help="First record this many pages of 200 articles from the live API",
+        )
+        parser.add_argument(
+            "--page-sizes",
+            default="50,100,200",
+            help="Comma-separated page sizes to benchmark",
+        )
+        parser.add_argument(
+            "--latency",
+            type=float,
+            default=0.1,
+            help="Simulated latency per request, in seconds",
+        )
+        parser.add_argument(
+            "--rate-limit-ratio",
+            type=float,
+            default=0.0,
+            help="Share of requests answered with a 429",
+        )
+        parser.add_argument(
+            "--rate-limit",
+            type=float,
+            default=settings.GUARDIAN_RATE_LIMIT,
+            help="Requests per second allowed by the client's rate limiter",
+        )
+        parser.add_argument(
+            "--yes",
+            action="store_true",
+            help="Confirm that the recorded articles may be deleted from the configured database",
+        )
+        parser.add_argument(
+            "--run",
+            action="store_true",
+            help="Internal: run a single page size in this process and print its results as JSON",
+        )
+
+    def handle(self, *args, **options):
+        fixtures = Path(options["fixtures"])
+        page_sizes = [int(size) for size in options["page_sizes"].split(",")]
+
+        if options["record_pages"]:
+            params = {
+                "show-fields": SHOW_FIELDS,
+                "show-tags": "keyword,contributor",
+                "page-size": PAGE_SIZE,
+                "order-by": "newest",
+                "type": TYPE,
+            }
+            recorded = record_fixtures(guardian_client, fixtures, params, options["record_pages"])
+            self.stdout.write(f"Recorded {recorded} articles into {fixtures}")
+
+        if not (fixtures / SEARCH_FIXTURE).exists():
+            raise CommandError(f"No recorded responses in {fixtures}, run with --record-pages first")
+
+        if not options["yes"]:
+            raise CommandError(
+                f"This deletes the recorded articles from {settings.DATABASES['default']['NAME']} "
+                "before each run; pass --yes to confirm"
+            )
+
+        if options["run"]:
+            self.stdout.write(json.dumps(self.run(fixtures, page_sizes[0], options)))
+            return
+
+        # Each page size runs in its own process so that peak RSS is its own
+        rows = []
+        for page_size in page_sizes:
+            output = subprocess.run(
+                [
+                    sys.executable, sys.argv[0], "benchmark_ingest", "--run", "--yes",
+                    "--fixtures", str(fixtures),
+                    "--page-sizes", str(page_size),
+                    "--latency", str(options["latency"]),
+                    "--rate-limit-ratio", str(options["rate_limit_ratio"]),
+                    "--rate-limit", str(options["rate_limit"]),
+                ],
+                capture_output=True,
+                text=True,
+                check=True,
+            ).stdout
+            rows.append(json.loads(output.strip().splitlines()[-1]))
+
+        self.stdout.write(
+            f"{'page size':>9} {'articles':>8} {'seconds':>8} {'art/s':>8} "
+            f"{'peak RSS MB':>11} {'mongo write s':>13} {'requests':>8} {'retried':>7}"
+        )
+        for row in rows:
+            self.stdout.write(
+                f"{row['page_size']:>9} {row['articles']:>8} {row['seconds']:>8.2f} "
+                f"{row['articles_per_second']:>8.1f} {row['peak_rss_mb']:>11.1f} "
+                f"{row['mongo_write_seconds']:>13.3f} {row['requests']:>8} {row['retried']:>7}"
+            )
+
+    def run(self, fixtures: Path, page_size: int, options) -> dict:
+        adapter = ReplayAdapter(
+            fixtures,
+            latency=options["latency"],
+            rate_limit_ratio=options["rate_limit_ratio"],
+            seed=0,
+        )
+        guardian_client.use_transport(adapter)
+        guardian_client.rate_limiter = TokenBucket(
+            rate=options["rate_limit"], capacity=settings.GUARDIAN_RATE_BURST
+        )
+
+        guardian_ids = [item["id"] for item in adapter.results]
+        oldest = min(parse_datetime(item["webPublicationDate"]) for item in adapter.results)
+        stop_age_hours = math.ceil((datetime.now(timezone.utc) - oldest).total_seconds() / 3600) + 1
+
+        # Start from a clean slate so that every recorded article is new
+        Article.objects.filter(guardian_id__in=guardian_ids).delete()
+        IngestCheckpoint.objects.filter(name=BENCHMARK_CHECKPOINT).delete()
+        write_timer.seconds = 0.0
+
+        start = time.perf_counter()
+        fetch_guardian_articles(
+            stop_age_hours=stop_age_hours,
+            only_recent=False,
+            page_size=page_size,
+            max_pages=math.ceil(len(guardian_ids) / page_size),
+            embed=False,
+            checkpoint_name=BENCHMARK_CHECKPOINT,
+        )
+        seconds = time.perf_counter() - start
+
+        articles = Article.objects.filter(guardian_id__in=guardian_ids).count()
+        metrics = guardian_client.metrics
+        return {
+            "page_size": page_size,
+            "articles": articles,
+            "seconds": seconds,
+            "articles_per_second": articles / seconds if seconds else 0.0,
+            # ru_maxrss is in kilobytes on Linux
+            "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+            "mongo_write_seconds": write_timer.seconds,
+            "requests": metrics.requests,
+            "retried": metrics.retries,
+        }
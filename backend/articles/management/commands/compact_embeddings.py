@@ -0,0 +1,84 @@
+from django.core.management.base import BaseCommand
+from django.db import connection
+from pymongo import UpdateOne
+from articles.models import Article, Chunk, EmbeddingCacheEntry
+from articles.vectors import SLOTS
+from utils.embeddings import truncate_embedding
+
+
+class Command(BaseCommand):
+    help = (
+        "Rewrite embeddings stored as arrays of doubles as packed float32 binary vectors, "
+        "and derive the missing truncated embeddings used for candidate search"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Number of documents to rewrite per bulk write",
+        )
+
+    def bulk_rewrite(self, collection, cursor, rewrite, batch_size) -> int:
+        """
+        Apply rewrite(doc) -> UpdateOne to every document of `cursor` in bulk writes.
+        """
+        modified = 0
+        updates = []
+        for doc in cursor:
+            updates.append(rewrite(doc))
+            if len(updates) >= batch_size:
+                modified += collection.bulk_write(updates, ordered=False).modified_count
+                updates = []
+        if updates:
+            modified += collection.bulk_write(updates, ordered=False).modified_count
+        return modified
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+
+        for model in (Article, Chunk, EmbeddingCacheEntry):
+            field = model._meta.get_field("embedding")
+            collection = connection.get_collection(model._meta.db_table)
+            legacy = collection.find(
+                {field.column: {"$type": "array"}},
+                {field.column: 1},
+                batch_size=batch_size,
+            )
+            converted = self.bulk_rewrite(
+                collection,
+                legacy,
+                # Only rewrite documents that were not rewritten meanwhile
+                lambda doc: UpdateOne(
+                    {"_id": doc["_id"], field.column: {"$type": "array"}},
+                    {"$set": {field.column: field.get_db_prep_value(doc[field.column], connection)}},
+                ),
+                batch_size,
+            )
+            self.stdout.write(f"{model._meta.label}: {converted} embeddings converted")
+
+        for model, slot in ((model, slot) for model in (Article, Chunk) for slot in SLOTS.values()):
+            field = model._meta.get_field(slot.field)
+            small_field = model._meta.get_field(slot.small_field)
+            collection = connection.get_collection(model._meta.db_table)
+            missing = collection.find(
+                {field.column: {"$ne": None}, small_field.column: None}, {field.column: 1}, batch_size=batch_size
+            )
+            derived = self.bulk_rewrite(
+                collection,
+                missing,
+                lambda doc: UpdateOne(
+                    {"_id": doc["_id"]},
+                    {
+                        "$set": {
+                            small_field.column: small_field.get_db_prep_value(
+                                truncate_embedding(field.to_python(doc[field.column]), small_field.size),
+                                connection,
+                            )
+                        }
+                    },
+                ),
+                batch_size,
+            )
+            self.stdout.write(f"{model._meta.label}.{slot.field}: {derived} truncated embeddings derived")
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+from tqdm import tqdm
+from articles.dedupe import fingerprint_chunks, save_fingerprints
+from articles.models import Chunk
+from articles.vectors import VECTOR_FIELDS
+from articles.pipeline import iter_batches
+
+
+class Command(BaseCommand):
+    help = (
+        "Fingerprint the chunks stored before duplicate detection, so that their copies share "
+        "embeddings and boilerplate drops out of vector search"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Number of chunks to fingerprint per batch",
+        )
+
+    def handle(self, *args, **options):
+        chunks = Chunk.objects.filter(fingerprint=None).only(
+            "article_id", "text", "content_hash", *VECTOR_FIELDS
+        )
+        with tqdm(total=chunks.count(), desc="Fingerprinting chunks", unit="chunk") as progress:
+            for batch in iter_batches(chunks, options["batch_size"]):
+                save_fingerprints(fingerprint_chunks(batch))
+                Chunk.objects.bulk_update(batch, ["fingerprint", "boilerplate", *VECTOR_FIELDS])
+                progress.update(len(batch))
+        self.stdout.write(f"Done, {Chunk.objects.filter(boilerplate=True).count()} boilerplate chunks in total")
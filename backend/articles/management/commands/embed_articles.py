@@ -1,42 +1,7 @@
 from django.core.management.base import BaseCommand
-from articles.models import Article
-import logging
-from utils.embeddings import embed
-
-logger = logging.getLogger(__name__)
-logger.setLevel(logging.INFO)
-if not logger.hasHandlers():
-    console_handler = logging.StreamHandler()
-    logger.addHandler(console_handler)
-
-def embed_articles(batch_size: int = 100):
-    """
-    Generates embeddings for articles that do not yet have embeddings.
-    """
-    articles = list(Article.objects.filter(embedding__isnull=True))
-    total = len(articles)
-
-    if total == 0:
-        logger.info("No articles found without embeddings. Exiting.")
-        return
-
-    logger.info(f"Starting embedding for {total} articles")
-
-    for i in range(0, total, batch_size):
-        batch = articles[i : i + batch_size]
-        contents = [a.body_text for a in batch]
-
-        try:
-            embeddings = embed(contents)
-            for article, embedding in zip(batch, embeddings):
-                article.embedding = embedding
-            Article.objects.bulk_update(batch, ["embedding"])
-            logger.info(
-                f"Embedded batch {i // batch_size + 1} of {((total - 1) // batch_size) + 1}"
-            )
-        except Exception as e:
-            logger.error(f"Error embedding batch {i // batch_size + 1}: {e}")
-        logger.info("Embedding process completed.")
+from django.conf import settings
+from articles.embedding import embed_articles, embedding_backlog
+from tqdm import tqdm
 
 
 class Command(BaseCommand):
@@ -49,7 +14,15 @@ class Command(BaseCommand):
             default=100,
             help="Number of articles to process in each batch",
         )
+        parser.add_argument(
+            "--full-text",
+            action="store_true",
+            help="Embed the whole body text instead of pooling the articles' chunk embeddings",
+        )
 
     def handle(self, *args, **options):
         batch_size = options["batch_size"]
-        embed_articles(batch_size=batch_size)
\ No newline at end of file
+        pool = settings.EMBEDDING_POOL_CHUNKS and not options["full_text"]
+        total = embedding_backlog(pool).count()
+        with tqdm(total=total, desc="Embedding articles", unit="article") as progress:
+            embed_articles(batch_size=batch_size, pool=pool, progress=progress.update)
\ No newline at end of file
@@ -0,0 +1,68 @@
+import os
+from urllib.parse import urlsplit
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from utils import local_embeddings
+from utils.batching import MicroBatcher
+from utils.embedding_service import ModelBatchers, make_server
+from utils.embeddings import default_model, embed_backend, split_model_id
+
+
+class Command(BaseCommand):
+    help = (
+        "Serve embeddings to the web and Celery workers of this host, coalescing their "
+        "concurrent requests into batches on one warm model"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--url",
+            default=settings.EMBEDDING_SERVICE_URL,
+            help="unix:///path/to/socket or http://127.0.0.1:PORT (default: EMBEDDING_SERVICE_URL)",
+        )
+        parser.add_argument(
+            "--batch-wait",
+            type=float,
+            default=settings.EMBEDDING_SERVICE_BATCH_WAIT,
+            help="Seconds to wait for more requests before embedding a batch",
+        )
+
+    def handle(self, *args, **options):
+        url = options["url"]
+        if not url:
+            raise CommandError("Pass --url or set EMBEDDING_SERVICE_URL")
+
+        parts = urlsplit(url)
+        if parts.scheme == "unix" and os.path.exists(parts.path):
+            # Left behind by a previous run
+            os.unlink(parts.path)
+
+        def make_batcher(model: str) -> MicroBatcher:
+            backend, name = split_model_id(model)
+            if backend == "local":
+                # Encode the coalesced batches directly: the embedder's own
+                # batcher would wait for more texts a second time
+                return MicroBatcher(
+                    local_embeddings.get_embedder(name).encode,
+                    batch_size=settings.EMBEDDING_LOCAL_BATCH_SIZE,
+                    batch_wait=options["batch_wait"],
+                )
+            return MicroBatcher(
+                lambda inputs: embed_backend(inputs, model),
+                batch_size=settings.EMBEDDING_BATCH_MAX_INPUTS,
+                batch_wait=options["batch_wait"],
+            )
+
+        # Any model is served on request, e.g. both models during a migration
+        batchers = ModelBatchers(make_batcher)
+        batchers.get(default_model())
+        server = make_server(url, batchers)
+        self.stdout.write(f"Serving embeddings on {url} (search model: {default_model()})")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            if parts.scheme == "unix" and os.path.exists(parts.path):
+                os.unlink(parts.path)
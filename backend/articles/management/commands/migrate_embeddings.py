@@ -0,0 +1,96 @@
+from django.core.management.base import BaseCommand, CommandError
+from articles.embedding import migrate_embeddings, migration_backlog
+from articles.models import Article
+from articles.vectors import current_version, roll_back, start_migration, stop_writing_inactive_slot
+from utils.embeddings import split_model_id
+from tqdm import tqdm
+
+
+class Command(BaseCommand):
+    help = (
+        "Migrate article and chunk embeddings to another model without downtime: the new "
+        "model's vectors fill the inactive slot while search keeps reading the active one, "
+        "then search cuts over to them at once"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "action",
+            choices=["start", "status", "run", "rollback", "finish"],
+            help=(
+                "start: write new vectors with --model too; status: show progress; "
+                "run: re-embed the backlog now instead of at EMBEDDING_MIGRATION_RATE; "
+                "rollback: search the previous model again; "
+                "finish: stop writing the previous model (or abandon a running migration)"
+            ),
+        )
+        parser.add_argument(
+            "--model",
+            help="Model to migrate to, as backend:name (e.g. ollama:bge-m3), with 1024 dimensions",
+        )
+        parser.add_argument(
+            "--limit",
+            type=int,
+            help="Maximum number of articles to re-embed with run",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=50,
+            help="Number of articles to re-embed in each batch",
+        )
+
+    def handle(self, *args, **options):
+        getattr(self, options["action"])(options)
+
+    def start(self, options):
+        if not options["model"]:
+            raise CommandError("start needs --model")
+        try:
+            split_model_id(options["model"])
+            version = start_migration(options["model"])
+        except ValueError as e:
+            raise CommandError(str(e))
+        self.stdout.write(
+            f"Migrating from {version.active_model} to {version.target_model} "
+            f"in the {version.target_slot} slot"
+        )
+
+    def status(self, options):
+        version = current_version(refresh=True)
+        self.stdout.write(f"Search: {version.active_model} ({version.active_slot} slot)")
+        if version.target_slot:
+            remaining = migration_backlog(version).count()
+            chunked = Article.objects.filter(chunked_at__isnull=False).count()
+            self.stdout.write(
+                f"Migrating to {version.target_model} ({version.target_slot} slot) since "
+                f"{version.started_at:%Y-%m-%d %H:%M}: {chunked - remaining}/{chunked} articles done"
+            )
+        elif version.model(version.inactive_slot):
+            self.stdout.write(
+                f"Cut over at {version.cutover_at:%Y-%m-%d %H:%M}, still writing "
+                f"{version.model(version.inactive_slot)} ({version.inactive_slot} slot) for rollback"
+            )
+
+    def run(self, options):
+        version = current_version(refresh=True)
+        if not version.target_slot:
+            raise CommandError("No migration is running")
+        total = migration_backlog(version).count()
+        if options["limit"] is not None:
+            total = min(total, options["limit"])
+        with tqdm(total=total, desc=f"Re-embedding with {version.target_model}", unit="article") as progress:
+            migrate_embeddings(batch_size=options["batch_size"], limit=options["limit"], progress=progress.update)
+        self.status(options)
+
+    def rollback(self, options):
+        if not roll_back():
+            raise CommandError("Nothing to roll back to: a migration is running or the previous model is no longer written")
+        self.status(options)
+
+    def finish(self, options):
+        version = current_version(refresh=True)
+        if not version.model(version.inactive_slot):
+            raise CommandError("Only one model is written already")
+        stop_writing_inactive_slot()
+        self.stdout.write(f"Stopped writing {version.model(version.inactive_slot)} vectors")
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.7 on 2026-10-16 21:01
+
+import django_mongodb_backend.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("articles", "0005_section_articles_se_section_b04c3d_idx"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="IngestCheckpoint",
+            fields=[
+                (
+                    "id",
+                    django_mongodb_backend.fields.ObjectIdAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=100, unique=True)),
+                ("watermark", models.DateTimeField(blank=True, null=True)),
+                ("run_from_date", models.DateTimeField(blank=True, null=True)),
+                ("run_watermark", models.DateTimeField(blank=True, null=True)),
+                ("page", models.PositiveIntegerField(default=0)),
+                ("page_size", models.PositiveIntegerField(blank=True, null=True)),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("running", "Running"),
+                            ("completed", "Completed"),
+                            ("failed", "Failed"),
+                        ],
+                        default="completed",
+                        max_length=10,
+                    ),
+                ),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
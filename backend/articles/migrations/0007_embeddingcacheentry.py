@@ -0,0 +1,45 @@
+# Generated by Django 5.2.7 on 2026-10-16 21:06
+
+import django_mongodb_backend.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("articles", "0006_ingestcheckpoint"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="EmbeddingCacheEntry",
+            fields=[
+                (
+                    "id",
+                    django_mongodb_backend.fields.ObjectIdAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("key", models.CharField(max_length=64, unique=True)),
+                ("model", models.CharField(max_length=100)),
+                (
+                    "embedding",
+                    django_mongodb_backend.fields.ArrayField(
+                        base_field=models.FloatField()
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("last_used_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["last_used_at"], name="articles_em_last_us_fa1a90_idx"
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.7 on 2026-10-16 21:09
+
+import articles.fields
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("articles", "0007_embeddingcacheentry"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="article",
+            name="embedding",
+            field=articles.fields.BinaryVectorField(blank=True, null=True, size=1024),
+        ),
+        migrations.AlterField(
+            model_name="chunk",
+            name="embedding",
+            field=articles.fields.BinaryVectorField(size=1024),
+        ),
+        migrations.AlterField(
+            model_name="embeddingcacheentry",
+            name="embedding",
+            field=articles.fields.BinaryVectorField(),
+        ),
+    ]
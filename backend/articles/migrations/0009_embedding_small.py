@@ -0,0 +1,41 @@
+# Generated by Django 5.2.7 on 2026-10-16 21:10
+
+import articles.fields
+import django_mongodb_backend.indexes
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("articles", "0008_binary_vector_embeddings"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="article",
+            name="embedding_small",
+            field=articles.fields.BinaryVectorField(blank=True, null=True, size=256),
+        ),
+        migrations.AddField(
+            model_name="chunk",
+            name="embedding_small",
+            field=articles.fields.BinaryVectorField(blank=True, null=True, size=256),
+        ),
+        migrations.AddIndex(
+            model_name="article",
+            index=django_mongodb_backend.indexes.VectorSearchIndex(
+                fields=["embedding_small"],
+                name="text_small_search_index",
+                similarities=["cosine"],
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="chunk",
+            index=django_mongodb_backend.indexes.VectorSearchIndex(
+                fields=["embedding_small"],
+                name="chunk_small_search_index",
+                similarities=["cosine"],
+            ),
+        ),
+    ]
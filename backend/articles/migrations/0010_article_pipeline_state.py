@@ -0,0 +1,79 @@
+# Generated by Django 5.2.7 on 2026-10-16 21:13
+
+import hashlib
+from datetime import datetime, timezone
+from django.db import migrations, models
+from pymongo import UpdateOne
+
+
+def backfill_pipeline_state(apps, schema_editor):
+    """
+    Mark the articles chunked or embedded before these fields existed, so
+    they don't land in the work queue, with the configured model, and
+    fingerprint every body.
+    """
+    from utils.embeddings import model_id
+
+    articles = schema_editor.connection.get_collection("articles_article")
+    chunks = schema_editor.connection.get_collection("articles_chunk")
+    now = datetime.now(timezone.utc)
+
+    articles.update_many(
+        {"_id": {"$in": chunks.distinct("article_id")}}, {"$set": {"chunked_at": now}}
+    )
+    articles.update_many(
+        {"embedding": {"$ne": None}}, {"$set": {"embedded_at": now, "embedding_model": model_id()}}
+    )
+
+    updates = []
+    for doc in articles.find({"body_text": {"$ne": None}}, {"body_text": 1}):
+        content_hash = hashlib.sha256(doc["body_text"].encode()).hexdigest()
+        updates.append(UpdateOne({"_id": doc["_id"]}, {"$set": {"content_hash": content_hash}}))
+        if len(updates) >= 1000:
+            articles.bulk_write(updates, ordered=False)
+            updates = []
+    if updates:
+        articles.bulk_write(updates, ordered=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("articles", "0009_embedding_small"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="article",
+            name="chunked_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="article",
+            name="content_hash",
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name="article",
+            name="embedded_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="article",
+            name="embedding_model",
+            field=models.CharField(blank=True, max_length=100, null=True),
+        ),
+        migrations.AddIndex(
+            model_name="article",
+            index=models.Index(
+                fields=["chunked_at"], name="articles_ar_chunked_c70226_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="article",
+            index=models.Index(
+                fields=["embedded_at"], name="articles_ar_embedde_d4245c_idx"
+            ),
+        ),
+        migrations.RunPython(backfill_pipeline_state, migrations.RunPython.noop),
+    ]
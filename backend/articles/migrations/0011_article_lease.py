@@ -0,0 +1,29 @@
+# Generated by Django 5.2.7 on 2026-10-16 21:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("articles", "0010_article_pipeline_state"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="article",
+            name="lease_expires_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="article",
+            name="lease_owner",
+            field=models.CharField(blank=True, max_length=100, null=True),
+        ),
+        migrations.AddIndex(
+            model_name="article",
+            index=models.Index(
+                fields=["lease_expires_at"], name="articles_ar_lease_e_bd6d23_idx"
+            ),
+        ),
+    ]
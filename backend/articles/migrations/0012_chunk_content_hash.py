@@ -0,0 +1,38 @@
+# Generated by Django 5.2.7 on 2026-10-16 21:30
+
+import hashlib
+from django.db import migrations, models
+from pymongo import UpdateOne
+
+
+def backfill_chunk_hashes(apps, schema_editor):
+    """
+    Fingerprint the stored chunks, so re-chunking can reuse their embeddings.
+    """
+    chunks = schema_editor.connection.get_collection("articles_chunk")
+
+    updates = []
+    for doc in chunks.find({"content_hash": None}, {"text": 1}):
+        content_hash = hashlib.sha256(doc["text"].encode()).hexdigest()
+        updates.append(UpdateOne({"_id": doc["_id"]}, {"$set": {"content_hash": content_hash}}))
+        if len(updates) >= 1000:
+            chunks.bulk_write(updates, ordered=False)
+            updates = []
+    if updates:
+        chunks.bulk_write(updates, ordered=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("articles", "0011_article_lease"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="chunk",
+            name="content_hash",
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.RunPython(backfill_chunk_hashes, migrations.RunPython.noop),
+    ]
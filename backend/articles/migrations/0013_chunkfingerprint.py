@@ -0,0 +1,67 @@
+# Generated by Django 5.2.7 on 2026-10-16 21:40
+
+import articles.fields
+import django_mongodb_backend.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("articles", "0012_chunk_content_hash"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ChunkFingerprint",
+            fields=[
+                (
+                    "id",
+                    django_mongodb_backend.fields.ObjectIdAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("content_hash", models.CharField(max_length=64, unique=True)),
+                (
+                    "shingle_bands",
+                    django_mongodb_backend.fields.ArrayField(
+                        base_field=models.CharField(max_length=32), default=list
+                    ),
+                ),
+                ("text", models.TextField()),
+                ("boilerplate", models.BooleanField(default=False)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["shingle_bands"], name="articles_ch_shingle_a298a0_idx"
+                    )
+                ],
+            },
+        ),
+        migrations.AddField(
+            model_name="chunk",
+            name="boilerplate",
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name="chunk",
+            name="fingerprint",
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.AlterField(
+            model_name="chunk",
+            name="embedding",
+            field=articles.fields.BinaryVectorField(blank=True, null=True, size=1024),
+        ),
+        migrations.AddIndex(
+            model_name="chunk",
+            index=models.Index(
+                fields=["fingerprint"], name="articles_ch_fingerp_e4e34f_idx"
+            ),
+        ),
+    ]
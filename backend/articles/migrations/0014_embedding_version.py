@@ -0,0 +1,158 @@
+# Generated by Django 5.2.7 on 2026-10-16 22:10
+
+import articles.fields
+import django_mongodb_backend.fields
+import django_mongodb_backend.indexes
+from django.db import migrations, models
+from pymongo import UpdateMany
+
+
+def backfill_chunk_models(apps, schema_editor):
+    """
+    Tag the stored chunk embeddings with the model of their article's, and
+    embeddings still untagged with the configured model (the one the
+    embedding version starts with), so they count as current.
+    """
+    from utils.embeddings import model_id
+
+    articles = schema_editor.connection.get_collection("articles_article")
+    chunks = schema_editor.connection.get_collection("articles_chunk")
+    untagged = {"embedding": {"$ne": None}, "embedding_model": None}
+    articles.update_many(untagged, {"$set": {"embedding_model": model_id()}})
+
+    updates = []
+    for doc in articles.find({"embedding_model": {"$ne": None}}, {"embedding_model": 1}):
+        updates.append(
+            UpdateMany(
+                {"article_id": doc["_id"], "embedding": {"$ne": None}, "embedding_model": None},
+                {"$set": {"embedding_model": doc["embedding_model"]}},
+            )
+        )
+        if len(updates) >= 1000:
+            chunks.bulk_write(updates, ordered=False)
+            updates = []
+    if updates:
+        chunks.bulk_write(updates, ordered=False)
+    # Chunks of articles without an embedding of their own
+    chunks.update_many(untagged, {"$set": {"embedding_model": model_id()}})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("articles", "0013_chunkfingerprint"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="EmbeddingVersion",
+            fields=[
+                (
+                    "id",
+                    django_mongodb_backend.fields.ObjectIdAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=100, unique=True)),
+                (
+                    "active_slot",
+                    models.CharField(
+                        choices=[("primary", "Primary"), ("shadow", "Shadow")],
+                        default="primary",
+                        max_length=10,
+                    ),
+                ),
+                (
+                    "target_slot",
+                    models.CharField(
+                        blank=True,
+                        choices=[("primary", "Primary"), ("shadow", "Shadow")],
+                        max_length=10,
+                        null=True,
+                    ),
+                ),
+                ("primary_model", models.CharField(blank=True, max_length=100, null=True)),
+                ("shadow_model", models.CharField(blank=True, max_length=100, null=True)),
+                ("started_at", models.DateTimeField(blank=True, null=True)),
+                ("cutover_at", models.DateTimeField(blank=True, null=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name="article",
+            name="shadow_embedding",
+            field=articles.fields.BinaryVectorField(blank=True, null=True, size=1024),
+        ),
+        migrations.AddField(
+            model_name="article",
+            name="shadow_embedding_small",
+            field=articles.fields.BinaryVectorField(blank=True, null=True, size=256),
+        ),
+        migrations.AddField(
+            model_name="article",
+            name="shadow_embedding_model",
+            field=models.CharField(blank=True, max_length=100, null=True),
+        ),
+        migrations.AddField(
+            model_name="chunk",
+            name="embedding_model",
+            field=models.CharField(blank=True, max_length=100, null=True),
+        ),
+        migrations.AddField(
+            model_name="chunk",
+            name="shadow_embedding",
+            field=articles.fields.BinaryVectorField(blank=True, null=True, size=1024),
+        ),
+        migrations.AddField(
+            model_name="chunk",
+            name="shadow_embedding_small",
+            field=articles.fields.BinaryVectorField(blank=True, null=True, size=256),
+        ),
+        migrations.AddField(
+            model_name="chunk",
+            name="shadow_embedding_model",
+            field=models.CharField(blank=True, max_length=100, null=True),
+        ),
+        migrations.AddIndex(
+            model_name="article",
+            index=models.Index(
+                fields=["shadow_embedding_model"], name="articles_ar_shadow__2b79ee_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="article",
+            index=django_mongodb_backend.indexes.VectorSearchIndex(
+                fields=["shadow_embedding"],
+                name="text_shadow_search_index",
+                similarities=["cosine"],
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="article",
+            index=django_mongodb_backend.indexes.VectorSearchIndex(
+                fields=["shadow_embedding_small"],
+                name="text_shadow_small_search_index",
+                similarities=["cosine"],
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="chunk",
+            index=django_mongodb_backend.indexes.VectorSearchIndex(
+                fields=["shadow_embedding"],
+                name="chunk_shadow_search_index",
+                similarities=["cosine"],
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="chunk",
+            index=django_mongodb_backend.indexes.VectorSearchIndex(
+                fields=["shadow_embedding_small"],
+                name="chunk_shadow_small_index",
+                similarities=["cosine"],
+            ),
+        ),
+        migrations.RunPython(backfill_chunk_models, migrations.RunPython.noop),
+    ]
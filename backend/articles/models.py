@@ -1,8 +1,28 @@
+import hashlib
 from django.db import models
 from django.conf import settings
-from django_mongodb_backend.fields import EmbeddedModelField, ArrayField, EmbeddedModelArrayField
+from django.utils.dateparse import parse_datetime
+from django_mongodb_backend.fields import ArrayField, EmbeddedModelField, EmbeddedModelArrayField
 from django_mongodb_backend.models import EmbeddedModel
 from django_mongodb_backend.indexes import SearchIndex, VectorSearchIndex
+from articles.fields import BinaryVectorField
+
+# Dimensions of the truncated (Matryoshka) embeddings searched before rescoring.
+# Fixed like the full vectors' 1024: the migrations build the vector indexes with it
+SMALL_DIMENSIONS = 256
+
+def parse_guardian_date(value):
+    return parse_datetime(value) if value else None
+
+
+def content_hash(text: str | None) -> str | None:
+    """
+    Fingerprint of an article body or chunk text, to tell whether it changed without loading it.
+    """
+    if text is None:
+        return None
+    return hashlib.sha256(text.encode()).hexdigest()
+
 
 class Section(models.Model):
     section_id = models.CharField(max_length=100, unique=True)
@@ -59,11 +79,26 @@ class Article(models.Model):
     thumbnail = models.URLField(blank=True, null=True)
     first_publication_date = models.DateTimeField(blank=True, null=True)
     last_modified = models.DateTimeField(blank=True, null=True)
-    embedding = ArrayField(models.FloatField(),size=1024, blank=True, null=True)
+    embedding = BinaryVectorField(size=1024, blank=True, null=True)
+    # Normalized prefix of `embedding`, searched first and rescored against the full vector
+    embedding_small = BinaryVectorField(size=SMALL_DIMENSIONS, blank=True, null=True)
+    # Second vector slot, filled with another model during a migration (see articles.vectors).
+    # Its vector search index is as fixed as the first's: only 1024-dim models can be migrated to
+    shadow_embedding = BinaryVectorField(size=1024, blank=True, null=True)
+    shadow_embedding_small = BinaryVectorField(size=SMALL_DIMENSIONS, blank=True, null=True)
+    shadow_embedding_model = models.CharField(max_length=100, blank=True, null=True)
     tags = EmbeddedModelArrayField(EmbeddedTag, blank=True, default=list)  # Embedded tags
     authors = EmbeddedModelArrayField(EmbeddedContributor, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Chunk/embedding pipeline state: unset timestamps are the work queue
+    content_hash = models.CharField(max_length=64, blank=True, null=True)
+    chunked_at = models.DateTimeField(blank=True, null=True)
+    embedded_at = models.DateTimeField(blank=True, null=True)
+    embedding_model = models.CharField(max_length=100, blank=True, null=True)
+    # Worker currently chunking or embedding the article (see articles.leases)
+    lease_owner = models.CharField(max_length=100, blank=True, null=True)
+    lease_expires_at = models.DateTimeField(blank=True, null=True)
     
 
     def __str__(self):
@@ -120,9 +155,10 @@ class Article(models.Model):
             headline=fields.get("headline"),
             trail_text=fields.get("trailText"),
             body_text=fields.get("bodyText"),
+            content_hash=content_hash(fields.get("bodyText")),
             thumbnail=fields.get("thumbnail"),
-            first_publication_date=item.get("webPublicationDate"),
-            last_modified=fields.get("lastModified"),
+            first_publication_date=parse_guardian_date(item.get("webPublicationDate")),
+            last_modified=parse_guardian_date(fields.get("lastModified")),
             tags=embedded_tags,
             authors=contributors,
         )
@@ -133,7 +169,14 @@ class Article(models.Model):
             models.Index(fields=['first_publication_date']),
             models.Index(fields=['created_at']),
             models.Index(fields=['last_modified']),
-            VectorSearchIndex(name="text_search_index", fields=["embedding"], similarities=["cosine"])
+            models.Index(fields=['chunked_at']),
+            models.Index(fields=['embedded_at']),
+            models.Index(fields=['lease_expires_at']),
+            models.Index(fields=['shadow_embedding_model']),
+            VectorSearchIndex(name="text_search_index", fields=["embedding"], similarities=["cosine"]),
+            VectorSearchIndex(name="text_small_search_index", fields=["embedding_small"], similarities=["cosine"]),
+            VectorSearchIndex(name="text_shadow_search_index", fields=["shadow_embedding"], similarities=["cosine"]),
+            VectorSearchIndex(name="text_shadow_small_search_index", fields=["shadow_embedding_small"], similarities=["cosine"]),
         ]
 
 
@@ -141,13 +184,183 @@ class Chunk(models.Model):
     article = models.ForeignKey(Article, on_delete=models.CASCADE, related_name='chunks')
     chunk_index = models.PositiveIntegerField()
     text = models.TextField()
-    embedding = ArrayField(models.FloatField(), size=1024)
+    content_hash = models.CharField(max_length=64, blank=True, null=True)
+    # Content hash of the ChunkFingerprint this text duplicates (or its own)
+    fingerprint = models.CharField(max_length=64, blank=True, null=True)
+    # Boilerplate chunks have no embedding, so they are left out of vector search
+    boilerplate = models.BooleanField(default=False)
+    embedding = BinaryVectorField(size=1024, blank=True, null=True)
+    embedding_small = BinaryVectorField(size=SMALL_DIMENSIONS, blank=True, null=True)
+    embedding_model = models.CharField(max_length=100, blank=True, null=True)
+    shadow_embedding = BinaryVectorField(size=1024, blank=True, null=True)
+    shadow_embedding_small = BinaryVectorField(size=SMALL_DIMENSIONS, blank=True, null=True)
+    shadow_embedding_model = models.CharField(max_length=100, blank=True, null=True)
 
     class Meta:
         unique_together=['article', 'chunk_index']
         indexes = [
-            VectorSearchIndex(name="chunk_search_index", fields=["embedding"], similarities=["cosine"])
+            models.Index(fields=['fingerprint']),
+            VectorSearchIndex(name="chunk_search_index", fields=["embedding"], similarities=["cosine"]),
+            VectorSearchIndex(name="chunk_small_search_index", fields=["embedding_small"], similarities=["cosine"]),
+            VectorSearchIndex(name="chunk_shadow_search_index", fields=["shadow_embedding"], similarities=["cosine"]),
+            VectorSearchIndex(name="chunk_shadow_small_index", fields=["shadow_embedding_small"], similarities=["cosine"]),
+        ]
+
+    def __str__(self):
+        return f'Chunk {self.chunk_index} of {self.article.web_title}'
+
+
+class ChunkFingerprint(models.Model):
+    """
+    A distinct chunk text of the corpus, with the MinHash band keys its
+    near-duplicates share (see articles.dedupe).
+    """
+    content_hash = models.CharField(max_length=64, unique=True)
+    shingle_bands = ArrayField(models.CharField(max_length=32), default=list)
+    text = models.TextField()
+    boilerplate = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['shingle_bands']),
+        ]
+
+    def __str__(self):
+        return f"Chunk fingerprint {self.content_hash[:12]}"
+
+
+class EmbeddingSlot(models.TextChoices):
+    PRIMARY = 'primary', 'Primary'
+    SHADOW = 'shadow', 'Shadow'
+
+
+class EmbeddingVersion(models.Model):
+    """
+    Which model the vectors of each slot (articles.vectors) come from, and
+    which slot search reads. A migration fills the inactive slot with the
+    target model while both slots are written; search cuts over by
+    switching active_slot in a single update.
+    """
+    name = models.CharField(max_length=100, unique=True)
+    active_slot = models.CharField(max_length=10, choices=EmbeddingSlot.choices, default=EmbeddingSlot.PRIMARY)
+    # Slot being filled by a migration
+    target_slot = models.CharField(max_length=10, choices=EmbeddingSlot.choices, blank=True, null=True)
+    primary_model = models.CharField(max_length=100, blank=True, null=True)
+    shadow_model = models.CharField(max_length=100, blank=True, null=True)
+    started_at = models.DateTimeField(blank=True, null=True)
+    cutover_at = models.DateTimeField(blank=True, null=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} ({self.active_slot}: {self.active_model})"
+
+    def model(self, slot: str) -> str | None:
+        return getattr(self, f"{slot}_model")
+
+    @property
+    def active_model(self) -> str:
+        return self.model(self.active_slot)
+
+    @property
+    def target_model(self) -> str | None:
+        return self.model(self.target_slot) if self.target_slot else None
+
+    @property
+    def inactive_slot(self) -> str:
+        return EmbeddingSlot.SHADOW if self.active_slot == EmbeddingSlot.PRIMARY else EmbeddingSlot.PRIMARY
+
+    def write_slots(self) -> list[tuple[str, str]]:
+        """
+        (slot, model) of every slot new vectors are written to, active first.
+        """
+        slots = [(self.active_slot, self.active_model)]
+        if self.model(self.inactive_slot):
+            slots.append((self.inactive_slot, self.model(self.inactive_slot)))
+        return slots
+
+
+class IngestStatus(models.TextChoices):
+    RUNNING = 'running', 'Running'
+    COMPLETED = 'completed', 'Completed'
+    FAILED = 'failed', 'Failed'
+
+
+class IngestCheckpoint(models.Model):
+    """
+    Progress of a named Guardian ingest, so the next run knows where to start
+    without scanning articles and an interrupted run can resume.
+    """
+    name = models.CharField(max_length=100, unique=True)
+    # Newest date ingested by completed runs
+    watermark = models.DateTimeField(blank=True, null=True)
+    # State of the current (or interrupted) run
+    run_from_date = models.DateTimeField(blank=True, null=True)
+    run_watermark = models.DateTimeField(blank=True, null=True)
+    page = models.PositiveIntegerField(default=0)  # last page fully processed
+    page_size = models.PositiveIntegerField(blank=True, null=True)
+    status = models.CharField(
+        max_length=10,
+        choices=IngestStatus.choices,
+        default=IngestStatus.COMPLETED,
+    )
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} ({self.status}, page {self.page})"
+
+    @property
+    def resumable(self):
+        return self.status != IngestStatus.COMPLETED and self.run_from_date is not None
+
+    def start_run(self, from_date, page_size):
+        self.run_from_date = from_date
+        self.run_watermark = None
+        self.page = 0
+        self.page_size = page_size
+        self.status = IngestStatus.RUNNING
+        self.save()
+
+    def resume(self):
+        self.status = IngestStatus.RUNNING
+        self.save(update_fields=["status", "updated_at"])
+
+    def record_page(self, page, newest_date=None):
+        self.page = page
+        if newest_date and (self.run_watermark is None or newest_date > self.run_watermark):
+            self.run_watermark = newest_date
+        self.save(update_fields=["page", "run_watermark", "updated_at"])
+
+    def fail(self):
+        self.status = IngestStatus.FAILED
+        self.save(update_fields=["status", "updated_at"])
+
+    def complete(self):
+        if self.run_watermark and (self.watermark is None or self.run_watermark > self.watermark):
+            self.watermark = self.run_watermark
+        self.run_from_date = None
+        self.run_watermark = None
+        self.page = 0
+        self.status = IngestStatus.COMPLETED
+        self.save()
+
+
+class EmbeddingCacheEntry(models.Model):
+    """
+    An embedding computed for a piece of text, keyed by a hash of the model
+    id and the normalized text (see utils.embeddings).
+    """
+    key = models.CharField(max_length=64, unique=True)
+    model = models.CharField(max_length=100)
+    embedding = BinaryVectorField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Bumped on cache hits, the least recently used entries are evicted first
+    last_used_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['last_used_at']),
         ]
 
     def __str__(self):
-        return f'Chunk {self.chunk_index} of {self.article.web_title}'
\ No newline at end of file
+        return f"{self.model} embedding {self.key[:12]}"
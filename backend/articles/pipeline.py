@@ -0,0 +1,101 @@
+import queue
+import threading
+from typing import Callable, Iterable
+from django.db import connections
+
+_DONE = object()
+
+
+def run_pipeline(source: Iterable, stages: list[Callable], queue_size: int = 2):
+    """
+    Push the items of `source` through `stages`, each stage running in its
+    own thread and handing its result to the next one through a bounded
+    queue. Reading the source, CPU work, inference and database writes thus
+    overlap, while at most `queue_size` items wait between two stages, so
+    memory stays flat however long the source is.
+
+    A stage returning None drops the item. If the source or a stage raises,
+    the pipeline stops and the exception is re-raised here.
+    """
+    queues = [queue.Queue(maxsize=queue_size) for _ in stages]
+    stop = threading.Event()
+    errors = []
+
+    def put(q, item) -> bool:
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def get(q):
+        while not stop.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return _DONE
+
+    def fail(e):
+        errors.append(e)
+        stop.set()
+
+    def feed():
+        try:
+            for item in source:
+                if not put(queues[0], item):
+                    return
+            put(queues[0], _DONE)
+        except Exception as e:
+            fail(e)
+        finally:
+            # Django connections are per thread
+            connections.close_all()
+
+    def work(stage, inbox, outbox):
+        try:
+            while (item := get(inbox)) is not _DONE:
+                result = stage(item)
+                if result is not None and outbox is not None and not put(outbox, result):
+                    return
+            if outbox is not None:
+                put(outbox, _DONE)
+        except Exception as e:
+            fail(e)
+        finally:
+            connections.close_all()
+
+    threads = [threading.Thread(target=feed, name="pipeline-source", daemon=True)]
+    for i, stage in enumerate(stages):
+        outbox = queues[i + 1] if i + 1 < len(stages) else None
+        threads.append(
+            threading.Thread(
+                target=work,
+                args=(stage, queues[i], outbox),
+                name=f"pipeline-{getattr(stage, '__name__', i)}",
+                daemon=True,
+            )
+        )
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    if errors:
+        raise errors[0]
+
+
+def iter_batches(queryset, batch_size: int):
+    """
+    Stream `queryset` from a database cursor in lists of `batch_size` objects.
+    """
+    batch = []
+    for obj in queryset.iterator(chunk_size=batch_size):
+        batch.append(obj)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
@@ -2,9 +2,10 @@ from langchain_core.prompts import ChatPromptTemplate
 from langchain_groq import ChatGroq
 from pydantic import BaseModel, Field
 from typing import Type
-from django_mongodb_backend.expressions import SearchVector
+from articles import search
 from articles.models import Article, Chunk
-from utils.embeddings import embed
+from articles.vectors import SLOTS, current_version
+from utils.embeddings import embed_query
 from users.models import User
 from django.conf import settings
 
@@ -99,19 +100,17 @@ def vector_search(refined_query: str, limit: int = 5):
     """
     Executes vector similarity search on all chunks.
     """
-    embedded_query = embed([refined_query])[0]
+    version = current_version()
+    embedded_query = embed_query(refined_query, version.active_model)
 
-    queryset = Chunk.objects.annotate(
-        score=SearchVector(
-            path="embedding",
-            query_vector=embedded_query,
-            limit=limit,
-            num_candidates=100
-        )
-    ).order_by("-score")
-
-    results = list(queryset.only("id", "text", "article_id")[:limit])
-    return results
+    return search.vector_search(
+        Chunk.objects.all(),
+        embedded_query,
+        limit=limit,
+        num_candidates=100,
+        fields=("id", "text", "article_id"),
+        slot=SLOTS[version.active_slot],
+    )
 
 
 # ------------------------------
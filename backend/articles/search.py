@@ -0,0 +1,61 @@
+import numpy as np
+from django.conf import settings
+from django_mongodb_backend.expressions import SearchVector
+from articles.vectors import SLOTS, VectorSlot
+from utils.embeddings import truncate_embedding
+
+
+def vector_search(
+    queryset,
+    query_embedding,
+    limit: int,
+    num_candidates: int,
+    fields: tuple | None = None,
+    slot: VectorSlot = SLOTS["primary"],
+) -> list:
+    """
+    Return the `limit` objects of `queryset` (Article or Chunk) closest to
+    `query_embedding`, best first, each with a `score` attribute.
+
+    Candidates come from the small index on the truncated vectors of `slot`,
+    EMBEDDING_RESCORE_OVERSAMPLE times more than needed, and are then
+    rescored by cosine similarity against its full vectors. With
+    EMBEDDING_RESCORE off, the full-dimension index is searched directly.
+    `query_embedding` must come from the slot's model. `fields` restricts the
+    loaded fields (the slot's vector is always loaded when rescoring).
+    """
+    if not settings.EMBEDDING_RESCORE:
+        queryset = queryset.annotate(
+            score=SearchVector(
+                path=slot.field,
+                query_vector=list(map(float, query_embedding)),
+                limit=limit,
+                num_candidates=num_candidates,
+            )
+        ).order_by("-score")
+        if fields:
+            queryset = queryset.only(*fields)
+        return list(queryset[:limit])
+
+    candidate_limit = limit * settings.EMBEDDING_RESCORE_OVERSAMPLE
+    queryset = queryset.annotate(
+        score=SearchVector(
+            path=slot.small_field,
+            query_vector=truncate_embedding(query_embedding).tolist(),
+            limit=candidate_limit,
+            num_candidates=max(num_candidates, candidate_limit),
+        )
+    )
+    if fields:
+        queryset = queryset.only(*fields, slot.field)
+    candidates = [obj for obj in queryset if slot.get(obj) is not None]
+    if not candidates:
+        return []
+
+    query = np.asarray(query_embedding, dtype=np.float32)
+    vectors = np.stack([slot.get(obj) for obj in candidates])
+    scores = vectors @ query / (np.linalg.norm(vectors, axis=1) * np.linalg.norm(query) + 1e-12)
+
+    for obj, score in zip(candidates, scores):
+        obj.score = float(score)
+    return sorted(candidates, key=lambda obj: obj.score, reverse=True)[:limit]
@@ -21,7 +21,20 @@ class ArticleSerializer(serializers.HyperlinkedModelSerializer):
 
     class Meta:
         model = Article
-        exclude = ('embedding', )
+        # Vectors and chunk/embedding pipeline state are internal
+        exclude = (
+            'embedding',
+            'embedding_small',
+            'embedding_model',
+            'shadow_embedding',
+            'shadow_embedding_small',
+            'shadow_embedding_model',
+            'content_hash',
+            'chunked_at',
+            'embedded_at',
+            'lease_owner',
+            'lease_expires_at',
+        )
 
     def get_tags(self, obj):
         if obj.tags:
@@ -1,71 +1,186 @@
-import requests
-import time
-from celery import shared_task
+from celery import chain, group, shared_task
+from bson import ObjectId
 from datetime import datetime, timedelta, timezone
-from articles.models import Article
+from articles.models import Article, IngestCheckpoint
+from articles.guardian import GuardianAPIError, client as guardian_client, iter_search_pages
+from articles import embedding
+from articles.vectors import CLEARED_VECTORS
 import logging
-import os
-import ollama
+from django.conf import settings
 from django.db import IntegrityError
-from django.db.transaction import atomic
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
 
-GUARDIAN_API_KEY = os.getenv("GUARDIAN_API_KEY")
-SHOW_FIELDS = "headline,trailText,standfirst,byline,body,bodyText,thumbnail,firstPublicationDate,lastModified"
+# Only the fields Article.from_guardian_result stores, the HTML body alone doubles the payload
+SHOW_FIELDS = "headline,trailText,bodyText,thumbnail,lastModified"
 PAGE_SIZE = 200
 MAX_PAGES = 10
 STOP_AGE_HOURS = 24
 TYPE = "article"
 
+# IngestCheckpoint names
+FETCH_CHECKPOINT = "guardian-search"
+UPSERT_CHECKPOINT = "guardian-search:upsert"
+
+# Fields rewritten when an edited article is upserted
+UPSERT_FIELDS = [
+    "section_id",
+    "section_name",
+    "web_title",
+    "web_url",
+    "api_url",
+    "headline",
+    "trail_text",
+    "body_text",
+    "content_hash",
+    "thumbnail",
+    "last_modified",
+    "tags",
+    "authors",
+    "updated_at",
+]
+
+def save_new_articles(articles: list[Article]) -> list[Article]:
+    """
+    Bulk insert articles, tolerating ones inserted concurrently by another run
+    (duplicate keys on the unique guardian_id index).
+    Returns the articles that were actually inserted.
+    """
+    # Assign ids up front so we can tell which documents made it in
+    for article in articles:
+        if article.pk is None:
+            article.pk = ObjectId()
+
+    try:
+        Article.objects.bulk_create(articles)
+        return articles
+    except IntegrityError:
+        pass
+
+    # The insert is ordered and stopped at the first duplicate:
+    # insert the remaining articles one by one
+    inserted_pks = set(
+        Article.objects.filter(pk__in=[a.pk for a in articles]).values_list("pk", flat=True)
+    )
+    saved = []
+    for article in articles:
+        if article.pk not in inserted_pks:
+            try:
+                article.save(force_insert=True)
+            except IntegrityError:
+                continue
+        saved.append(article)
+    return saved
+
+
+def save_updated_articles(articles: list[Article]) -> list[Article]:
+    """
+    Bulk write edited versions of already stored articles (pk must be set).
+    Articles whose body changed lose their embedding and go back onto the
+    chunk/embedding work queue. Their chunks stay searchable until then, and
+    re-chunking embeds only the chunks whose text changed.
+    Returns the articles whose body changed.
+    """
+    now = datetime.now(timezone.utc)
+    for article in articles:
+        article.updated_at = now
+
+    stored_hashes = dict(
+        Article.objects.filter(pk__in=[a.pk for a in articles]).values_list("pk", "content_hash")
+    )
+    changed = [a for a in articles if stored_hashes.get(a.pk) != a.content_hash]
+
+    Article.objects.bulk_update(articles, UPSERT_FIELDS)
+    if changed:
+        # Back onto the chunk/embedding work queue
+        Article.objects.filter(pk__in=[a.pk for a in changed]).update(
+            **CLEARED_VECTORS, chunked_at=None, embedded_at=None
+        )
+
+    return changed
+
+
 @shared_task(queue="news_fetching")
 def fetch_guardian_articles(
     stop_age_hours: int = STOP_AGE_HOURS,
     only_recent: bool = True,
     page_size: int | None = None,
     max_pages = MAX_PAGES,
+    upsert: bool = False,
+    embed: bool = True,
+    checkpoint_name: str | None = None,
 ):
+    """
+    Fetch new articles from the Guardian API.
+
+    Unless embed=False, each page's new (or re-written) articles are handed to
+    the chunk and embedding tasks as soon as they are saved.
+
+    With upsert=True, articles are fetched by last modification date instead of
+    publication date, and stored articles whose lastModified is newer than
+    Article.last_modified are updated in place.
+
+    checkpoint_name overrides the IngestCheckpoint the run reads and updates,
+    so that benchmarks do not move the real watermark.
+    """
     logger.info("=== Starting Guardian fetch task ===")
+    guardian_client.metrics.reset()
 
-    base_url = "https://content.guardianapis.com/search"
-    page = 1
     total_fetched = 0
+    total_updated = 0
 
-    from_date = None
-    stop_age_date = datetime.now(timezone.utc) - timedelta(hours=stop_age_hours)
+    # In upsert mode the watermark and the stop condition use the modification date
+    date_field = "last_modified" if upsert else "first_publication_date"
 
-    most_recent_article = Article.objects.order_by("-first_publication_date").first()
-    if (
-        only_recent
-        and most_recent_article
-        and most_recent_article.first_publication_date > stop_age_date
-    ):
-        from_date = most_recent_article.first_publication_date
-    else:
-        from_date = stop_age_date
-
-    existing_ids = set(
-        Article.objects.values_list(
-            "guardian_id", flat=True
-        )
+    checkpoint, _ = IngestCheckpoint.objects.get_or_create(
+        name=checkpoint_name or (UPSERT_CHECKPOINT if upsert else FETCH_CHECKPOINT)
     )
 
-    if page_size is None:
-        # Depends on how recent the from_date is
-        hours_diff = (datetime.now(timezone.utc) - from_date).total_seconds() / 3600
-        if hours_diff <= 1:
-            page_size = 20
-        elif hours_diff <= 6:
-            page_size = 50
-        elif hours_diff <= 12:
-            page_size = 100
+    resuming = only_recent and checkpoint.resumable
+    if resuming:
+        # Pick up an interrupted run exactly where it stopped
+        from_date = checkpoint.run_from_date
+        page_size = checkpoint.page_size
+        start_page = checkpoint.page + 1
+        checkpoint.resume()
+        logger.info(f"Resuming interrupted fetch at page {start_page}")
+    else:
+        stop_age_date = datetime.now(timezone.utc) - timedelta(hours=stop_age_hours)
+
+        most_recent_date = checkpoint.watermark
+        if most_recent_date is None:
+            # No checkpoint yet, fall back to the newest stored article
+            most_recent_article = Article.objects.order_by(f"-{date_field}").first()
+            most_recent_date = getattr(most_recent_article, date_field, None)
+            checkpoint.watermark = most_recent_date
+
+        if (
+            only_recent
+            and most_recent_date
+            and most_recent_date > stop_age_date
+        ):
+            from_date = most_recent_date
         else:
-            page_size = PAGE_SIZE
+            from_date = stop_age_date
+
+        if page_size is None:
+            # Depends on how recent the from_date is
+            hours_diff = (datetime.now(timezone.utc) - from_date).total_seconds() / 3600
+            if hours_diff <= 1:
+                page_size = 20
+            elif hours_diff <= 6:
+                page_size = 50
+            elif hours_diff <= 12:
+                page_size = 100
+            else:
+                page_size = PAGE_SIZE
+
+        start_page = 1
+        checkpoint.start_run(from_date, page_size)
 
     params_base = {
-        "api-key": GUARDIAN_API_KEY,
         "show-fields": SHOW_FIELDS,
         "show-tags": "keyword,contributor",
         "page-size": page_size,
@@ -73,29 +188,34 @@ def fetch_guardian_articles(
         "type": TYPE,
     }
 
+    if upsert:
+        params_base["use-date"] = "last-modified"
+        params_base["order-date"] = "last-modified"
+
     if from_date:
         params_base["from-date"] = from_date.strftime("%Y-%m-%dT%H:%M:%SZ")
         logger.info(f"Fetching articles from {from_date.isoformat()} onwards")
     else:
         logger.info("Fetching all articles without date restriction")
 
-    while True:
-        params = params_base.copy() | {"page": page}
+    pages = iter_search_pages(
+        params_base,
+        max_pages=max_pages,
+        build=Article.from_guardian_result,
+        start_page=start_page,
+    )
 
-        logger.info(f"Requesting page {page} from Guardian API")
+    failed = False
+    while True:
         try:
-            response = requests.get(base_url, params=params, timeout=10)
-            response.raise_for_status()
-        except requests.RequestException as e:
-            try:
-                error_data = e.response.json() if e.response else {}
-                message = error_data.get("message", str(e))
-            except Exception:
-                message = str(e)
-            logger.error(f"Failed to fetch page {page}: {message}")
+            page, data = next(pages)
+        except StopIteration:
+            break
+        except GuardianAPIError as e:
+            logger.error(str(e))
+            failed = True
             break
 
-        data = response.json()["response"]
         results = data["results"]
         total_pages = min(data["pages"], max_pages)
 
@@ -105,38 +225,69 @@ def fetch_guardian_articles(
 
         logger.info(f"Processing {len(results)} articles from page {page}")
 
+        # Only look up the IDs on this page, not the whole collection
+        existing = {
+            guardian_id: (pk, last_modified)
+            for guardian_id, pk, last_modified in Article.objects.filter(
+                guardian_id__in=[article.guardian_id for article in results]
+            ).values_list("guardian_id", "pk", "last_modified")
+        }
+
         new_articles = []
+        updated_articles = []
         reached_max_age = False
-        for i, item in enumerate(results, start=1):
+        for i, article in enumerate(results, start=1):
 
-            guardian_id = item["id"]
-            article_date = datetime.fromisoformat(
-                item["webPublicationDate"].replace("Z", "+00:00")
-            )
-            if article_date < from_date:
+            guardian_id = article.guardian_id
+            # lastModified may be missing from a result: fall back to its publication date
+            article_date = (article.last_modified or article.first_publication_date) if upsert else article.first_publication_date
+            if from_date and article_date is not None and article_date < from_date:
                 logger.info(
                     f"Article {guardian_id} ( article {i}/{len(results)} ) is older than from_date, stopping fetch for this page"
                 )
                 reached_max_age = True
                 break
 
-            if guardian_id in existing_ids:
+            # Exclude empty text articles
+            if not (article.body_text or "").strip():
                 continue
 
-            # Exclude empty text articles
-            if item["fields"]["bodyText"].strip() == "":
+            if guardian_id in existing:
+                pk, last_modified = existing[guardian_id]
+                if upsert and (last_modified is None or article_date is None or article_date > last_modified):
+                    article.pk = pk
+                    updated_articles.append(article)
                 continue
 
-            new_articles.append(Article.from_guardian_result(item))
-            existing_ids.add(guardian_id)
+            new_articles.append(article)
+            existing[guardian_id] = (None, None)
 
         logger.info(f"Page {page} of {total_pages} processed.")
 
         if new_articles:
-            Article.objects.bulk_create(new_articles)
+            new_articles = save_new_articles(new_articles)
             logger.info(f"Saved {len(new_articles)} new articles from page {page}")
             total_fetched += len(new_articles)
-        elif from_date:
+
+        changed_articles = []
+        if updated_articles:
+            changed_articles = save_updated_articles(updated_articles)
+            logger.info(
+                f"Updated {len(updated_articles)} articles from page {page} "
+                f"({len(changed_articles)} with a new body to re-embed)"
+            )
+            total_updated += len(updated_articles)
+
+        if embed and (new_articles or changed_articles):
+            dispatch_embedding([a.pk for a in new_articles + changed_articles])
+
+        dates = [a.last_modified if upsert else a.first_publication_date for a in results]
+        checkpoint.record_page(page, max(filter(None, dates), default=None))
+
+        # Articles published since an interrupted run shift already saved ones onto the resumed page
+        shifted_page = resuming and page == start_page
+
+        if not new_articles and not updated_articles and from_date and not shifted_page:
             logger.info("No new articles found on this page, stopping fetch.")
             break
 
@@ -151,43 +302,87 @@ def fetch_guardian_articles(
             logger.info("Reached last page, stopping fetch.")
             break
 
-        page += 1
-        time.sleep(1)
+    # Cancels the pages still queued if we stopped early
+    pages.close()
+
+    if failed:
+        checkpoint.fail()
+        logger.info(f"Checkpoint saved at page {checkpoint.page}, the next run will resume from there")
+    else:
+        checkpoint.complete()
 
     logger.info(
-        f"=== Guardian fetch task completed: total new articles saved: {total_fetched} ==="
+        f"=== Guardian fetch task completed: total new articles saved: {total_fetched}, "
+        f"updated: {total_updated} ==="
     )
+    logger.info(f"Guardian API: {guardian_client.metrics.summary()}")
+
 
+@shared_task(queue="embeddings")
+def embed_articles(batch_size: int = 100, article_ids: list[str] | None = None):
+    """
+    Celery task that generates embeddings for the given articles, or for all
+    articles that do not yet have embeddings, in batches.
+    """
+    embedding.embed_articles(batch_size=batch_size, article_ids=article_ids)
 
-EMBEDDING_MODEL = "qwen3-embedding:0.6B"
 
 @shared_task(queue="embeddings")
-def embed_articles(batch_size: int = 100):
+def embed_article_chunks(article_ids: list[str]):
     """
-    Celery task that generates embeddings for all articles
-    that do not yet have embeddings, in batches.
+    Celery task that chunks and embeds the given articles.
     """
-    articles = list(Article.objects.filter(embedding__isnull=True))
-    total = len(articles)
+    embedding.chunk_articles(article_ids)
 
-    if total == 0:
-        logger.info("No articles found without embeddings. Exiting.")
-        return
 
-    logger.info(f"Starting embedding for {total} articles")
+@shared_task(queue="embeddings")
+def drain_embedding_backlog(batch_size: int = 30, max_articles: int | None = 2000):
+    """
+    Celery task that chunks and embeds articles of the backlog, at most
+    max_articles of them so it ends well within the task time limit.
+    Batches are leased, so any number of these can run at once.
+    """
+    embedding.chunk_articles(
+        batch_size=batch_size, queryset=embedding.chunking_backlog(), limit=max_articles
+    )
+    if not settings.EMBEDDING_POOL_CHUNKS:
+        embedding.embed_articles()
+
 
-    for i in range(0, total, batch_size):
-        batch = articles[i : i + batch_size]
-        contents = [a.body_text for a in batch]
+@shared_task(queue="embeddings")
+def migrate_embeddings(max_articles: int | None = None):
+    """
+    Celery task, run every minute, that re-embeds the next articles of a
+    running embedding model migration, at most EMBEDDING_MIGRATION_RATE
+    of them, and cuts search over once they are all done.
+    """
+    embedding.migrate_embeddings(limit=max_articles or settings.EMBEDDING_MIGRATION_RATE)
 
-        try:
-            embeddings = ollama.embed(EMBEDDING_MODEL, contents)["embeddings"]
-            for article, embedding in zip(batch, embeddings):
-                article.embedding = embedding
-            Article.objects.bulk_update(batch, ["embedding"])
-            logger.info(
-                f"Embedded batch {i // batch_size + 1} of {((total - 1) // batch_size) + 1}"
-            )
-        except Exception as e:
-            logger.error(f"Error embedding batch {i // batch_size + 1}: {e}")
-        logger.info("Embedding process completed.")
\ No newline at end of file
+
+def dispatch_backlog_workers(workers: int, batch_size: int = 30, max_articles: int | None = 2000):
+    """
+    Queue `workers` drain_embedding_backlog tasks, drained in parallel by
+    the workers consuming the embeddings queue.
+    """
+    group(
+        drain_embedding_backlog.si(batch_size=batch_size, max_articles=max_articles)
+        for _ in range(workers)
+    ).apply_async()
+
+
+def dispatch_embedding(article_ids: list):
+    """
+    Hand freshly ingested articles to the chunk and article embedding tasks
+    on the embeddings queue. When article embeddings are pooled from chunk
+    embeddings, the chunk task sets them itself. Otherwise the two run one
+    after the other: both lease the articles, so the second of two parallel
+    tasks would find them leased and leave them to the periodic drain.
+    """
+    ids = [str(pk) for pk in article_ids]
+    if settings.EMBEDDING_POOL_CHUNKS:
+        embed_article_chunks.delay(ids)
+        return
+    chain(
+        embed_article_chunks.si(ids),
+        embed_articles.si(article_ids=ids),
+    ).apply_async()
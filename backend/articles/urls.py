@@ -1,6 +1,6 @@
 from rest_framework.routers import DefaultRouter
 from django.urls import path, include
-from .views import ArticleViewSet, SectionViewSet
+from .views import ArticleViewSet, EmbeddingStatsView, SectionViewSet
 
 router = DefaultRouter()
 router.register(r'articles', ArticleViewSet, basename='article')
@@ -8,4 +8,5 @@ router.register(r'sections', SectionViewSet, basename='section')
 
 urlpatterns = [
     path('', include(router.urls)),
+    path('embedding-stats/', EmbeddingStatsView.as_view(), name='embedding-stats'),
 ]
\ No newline at end of file
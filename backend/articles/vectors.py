@@ -0,0 +1,143 @@
+import threading
+import time
+from typing import NamedTuple
+from django.conf import settings
+from django.utils import timezone
+from articles.models import Article, EmbeddingSlot, EmbeddingVersion
+from utils.embeddings import embed_uncached, model_id, truncate_embedding
+
+VERSION_NAME = "default"
+
+
+class VectorSlot(NamedTuple):
+    """
+    The fields of Article and Chunk holding one model's vectors.
+    """
+    field: str
+    small_field: str
+    model_field: str
+
+    @property
+    def fields(self) -> list[str]:
+        return [self.field, self.small_field, self.model_field]
+
+    def get(self, obj):
+        return getattr(obj, self.field)
+
+    def model(self, obj) -> str | None:
+        return getattr(obj, self.model_field)
+
+    def set(self, obj, embedding, model: str):
+        setattr(obj, self.field, embedding)
+        setattr(obj, self.small_field, None if embedding is None else truncate_embedding(embedding))
+        setattr(obj, self.model_field, model)
+
+    def copy(self, source, obj):
+        for field in self.fields:
+            setattr(obj, field, getattr(source, field))
+
+    def cleared(self) -> dict:
+        return {field: None for field in self.fields}
+
+
+SLOTS = {
+    EmbeddingSlot.PRIMARY: VectorSlot("embedding", "embedding_small", "embedding_model"),
+    EmbeddingSlot.SHADOW: VectorSlot("shadow_embedding", "shadow_embedding_small", "shadow_embedding_model"),
+}
+VECTOR_FIELDS = [field for slot in SLOTS.values() for field in slot.fields]
+CLEARED_VECTORS = {field: None for field in VECTOR_FIELDS}
+
+_lock = threading.Lock()
+_cached = (0.0, None)
+
+
+def current_version(refresh: bool = False) -> EmbeddingVersion:
+    """
+    The embedding version, re-read at most every EMBEDDING_VERSION_TTL
+    seconds. Read it once per request or batch, so that the query model and
+    the searched slot (or the written slots) always go together.
+    """
+    global _cached
+    with _lock:
+        read_at, version = _cached
+        if refresh or version is None or time.monotonic() - read_at > settings.EMBEDDING_VERSION_TTL:
+            version, _ = EmbeddingVersion.objects.get_or_create(
+                name=VERSION_NAME, defaults={"primary_model": model_id()}
+            )
+            _cached = (time.monotonic(), version)
+        return version
+
+
+def write_slots(version: EmbeddingVersion | None = None) -> list[tuple[VectorSlot, str]]:
+    """
+    (VectorSlot, model) pairs new vectors are written to.
+    """
+    version = version or current_version()
+    return [(SLOTS[slot], model) for slot, model in version.write_slots()]
+
+
+def has_vectors(obj, slots: list[tuple[VectorSlot, str]]) -> bool:
+    """
+    Whether `obj` has vectors of the right model in every slot.
+    """
+    return all(slot.get(obj) is not None and slot.model(obj) == model for slot, model in slots)
+
+
+def start_migration(model: str) -> EmbeddingVersion:
+    """
+    Start filling the inactive slot with `model`. From then on new vectors
+    are written to both slots. The model's vectors must have the slot's
+    dimensions, which its vector search indexes are built with.
+    """
+    version = current_version(refresh=True)
+    if version.target_slot:
+        raise ValueError(f"A migration to {version.target_model} is already running")
+    if model == version.active_model:
+        raise ValueError(f"{model} is already the active model")
+    slot = version.inactive_slot
+    size = Article._meta.get_field(SLOTS[slot].field).size
+    dimensions = len(embed_uncached(["Embedding dimensions check"], model)[0])
+    if dimensions != size:
+        raise ValueError(f"{model} embeds in {dimensions} dimensions, the {slot} slot holds {size}")
+    EmbeddingVersion.objects.filter(pk=version.pk, target_slot=None).update(
+        target_slot=slot, started_at=timezone.now(), cutover_at=None, **{f"{slot}_model": model}
+    )
+    return current_version(refresh=True)
+
+
+def cut_over(version: EmbeddingVersion) -> bool:
+    """
+    Make search read the target slot: one update of the version document,
+    so every process switches model and slot together.
+    """
+    return bool(
+        EmbeddingVersion.objects.filter(pk=version.pk, target_slot=version.target_slot).update(
+            active_slot=version.target_slot, target_slot=None, cutover_at=timezone.now()
+        )
+    )
+
+
+def roll_back() -> bool:
+    """
+    Make search read the previous slot again, as long as it is still written.
+    """
+    version = current_version(refresh=True)
+    if version.target_slot or not version.model(version.inactive_slot):
+        return False
+    return bool(
+        EmbeddingVersion.objects.filter(pk=version.pk, active_slot=version.active_slot, target_slot=None).update(
+            active_slot=version.inactive_slot, cutover_at=timezone.now()
+        )
+    )
+
+
+def stop_writing_inactive_slot() -> EmbeddingVersion:
+    """
+    Once a migration is cut over, stop writing the previous model's vectors
+    (until then, switching active_slot back is an instant rollback), or
+    abandon a migration that is still running.
+    """
+    version = current_version(refresh=True)
+    slot = version.inactive_slot
+    EmbeddingVersion.objects.filter(pk=version.pk).update(target_slot=None, **{f"{slot}_model": None})
+    return current_version(refresh=True)
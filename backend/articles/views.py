@@ -2,14 +2,20 @@ from rest_framework import viewsets
 from .models import Article, Section, Chunk
 from users.models import Bookmark, User, UserType
 from .serializers import ArticleSerializer, SectionSerializer
-from rest_framework.permissions import AllowAny
+from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework import status
-from users.permissions import BookmarkPermission
-from django_mongodb_backend.expressions import SearchVector
-from utils.embeddings import embed
+from rest_framework.views import APIView
+from users.permissions import BookmarkPermission, IsAdmin
+from .search import vector_search
+from .embedding import chunking_backlog, migration_backlog
+from .vectors import SLOTS, VECTOR_FIELDS, current_version
+from utils.embeddings import embed_query, query_cache
 from .qa_pipeline import run_article_qa_pipeline
+from .cache import SECTIONS_TIMEOUT, sections_cache_version
+from rest_framework_extensions.cache.decorators import cache_response
+from django.utils import timezone
 import traceback
 
 class ArticleViewSet(viewsets.ReadOnlyModelViewSet):
@@ -28,26 +34,27 @@ class ArticleViewSet(viewsets.ReadOnlyModelViewSet):
     def get_queryset(self):
 
         if query := self.request.query_params.get('q'):
-            embedded_query = embed([query])[0]
-
-            results = Chunk.objects.annotate(
-                score=SearchVector(
-                    path="embedding",
-                    query_vector=embedded_query,
-                    limit=20,
-                    num_candidates=150,
-                )
-            ).order_by("-score").only("article_id") # This is the default behavior.
+            version = current_version()
+            embedded_query = embed_query(query, version.active_model)
+
+            results = vector_search(
+                Chunk.objects.all(),
+                embedded_query,
+                limit=20,
+                num_candidates=150,
+                fields=("article_id",),
+                slot=SLOTS[version.active_slot],
+            )
 
             # Keep first (highest scored) chunk per article
             seen_article_ids = set()
             sorted_article_ids = []
-            for article_id, score in results.values_list("article_id", "score"):
+            for article_id in (chunk.article_id for chunk in results):
                 if article_id not in seen_article_ids:
                     seen_article_ids.add(article_id)
                     sorted_article_ids.append(article_id)
 
-            articles_dict = Article.objects.in_bulk(sorted_article_ids)
+            articles_dict = Article.objects.defer(*VECTOR_FIELDS).in_bulk(sorted_article_ids)
 
             ranked_articles = [articles_dict[a_id] for a_id in sorted_article_ids if a_id in articles_dict]
 
@@ -59,13 +66,15 @@ class ArticleViewSet(viewsets.ReadOnlyModelViewSet):
             preferred = "preferred" in self.request.query_params and self.request.query_params["preferred"].lower() == "true"
 
             if user.user_type == UserType.ADMIN:
-                return Article.objects.all().order_by("-first_publication_date")
+                return Article.objects.defer(*VECTOR_FIELDS).order_by("-first_publication_date")
 
             if user.user_type == UserType.READER and preferred:
                 section_ids = [s.section_id for s in user.preferred_sections]
-                return Article.objects.filter(section_id__in=section_ids).order_by("-first_publication_date")
+                return Article.objects.filter(section_id__in=section_ids).defer(*VECTOR_FIELDS).order_by(
+                    "-first_publication_date"
+                )
 
-        return Article.objects.all().order_by("-first_publication_date")
+        return Article.objects.defer(*VECTOR_FIELDS).order_by("-first_publication_date")
 
     @action(detail=True, methods=["get"], url_path="similar")
     def similar_articles(self, request, pk=None):
@@ -74,23 +83,20 @@ class ArticleViewSet(viewsets.ReadOnlyModelViewSet):
         excluding the article itself.
         """
         article = self.get_object()  # 404 if article does not exist
-        if not article.embedding:
+        slot = SLOTS[current_version().active_slot]
+        if slot.get(article) is None:
             return Response(
                 {"detail": "This article has no embedding."},
                 status=status.HTTP_404_NOT_FOUND,
             )
 
-        results = (
-            Article.objects.exclude(id=article.id)  # do not recommend itself
-            .annotate(
-                score=SearchVector(
-                    path="embedding",
-                    query_vector=article.embedding,
-                    limit=4,
-                    num_candidates=150,
-                )
-            )
-            .order_by("-score")
+        results = vector_search(
+            # Do not recommend itself; the searched vector is loaded for rescoring
+            Article.objects.exclude(id=article.id).defer(*(f for f in VECTOR_FIELDS if f != slot.field)),
+            slot.get(article),
+            limit=4,
+            num_candidates=150,
+            slot=slot,
         )
 
         top_three = results
@@ -144,7 +150,63 @@ class ArticleViewSet(viewsets.ReadOnlyModelViewSet):
                             status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+def section_key_func(view_instance, view_method, request, args, kwargs):
+    """
+    Build a cache key that changes whenever the sections are re-synced.
+    """
+    return f"sections:{sections_cache_version()}:{view_method.__name__}:{request.build_absolute_uri()}"
+
+
 class SectionViewSet(viewsets.ReadOnlyModelViewSet):
     serializer_class = SectionSerializer
     permission_classes = [AllowAny]
-    queryset = Section.objects.all()
\ No newline at end of file
+    queryset = Section.objects.all()
+
+    @cache_response(timeout=SECTIONS_TIMEOUT, key_func=section_key_func, cache="shared")
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @cache_response(timeout=SECTIONS_TIMEOUT, key_func=section_key_func, cache="shared")
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
+
+class EmbeddingStatsView(APIView):
+    """
+    Chunk/embedding backlog counts, and query embedding cache counters of
+    the process serving the request.
+    """
+    permission_classes = [IsAuthenticated, IsAdmin]
+
+    def get(self, request):
+        version = current_version()
+        migration = None
+        if version.target_slot:
+            migration = {
+                "target_model": version.target_model,
+                "started_at": version.started_at,
+                "remaining": migration_backlog(version).count(),
+                "chunked": Article.objects.filter(chunked_at__isnull=False).count(),
+            }
+        return Response({
+            "backlog": {
+                "articles": Article.objects.count(),
+                "unchunked": chunking_backlog().count(),
+                "unembedded": Article.objects.filter(embedded_at__isnull=True).count(),
+                "leased": Article.objects.filter(lease_expires_at__gt=timezone.now()).count(),
+                "outdated_model": Article.objects.filter(embedded_at__isnull=False)
+                .exclude(**{SLOTS[version.active_slot].model_field: version.active_model})
+                .count(),
+            },
+            "model": {
+                "active": version.active_model,
+                "active_slot": version.active_slot,
+                "cutover_at": version.cutover_at,
+                "migration": migration,
+            },
+            "chunks": {
+                "total": Chunk.objects.count(),
+                "boilerplate": Chunk.objects.filter(boilerplate=True).count(),
+            },
+            "query_cache": query_cache.stats(),
+        })
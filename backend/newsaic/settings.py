@@ -137,6 +137,19 @@ STATIC_URL = "static/"
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Cache
+# "shared" is seen by every process on the host (web, Celery, management commands)
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "shared": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": os.path.join(BASE_DIR, ".var/cache"),
+    },
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -155,6 +168,19 @@ REST_FRAMEWORK = {
     'PAGE_SIZE' : 100,
 }
 
+# articles.* modules (pipeline stages, leases, tasks) log progress to the
+# console, whether run from a management command or a worker
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {
+        "console": {"class": "logging.StreamHandler"},
+    },
+    "loggers": {
+        "articles": {"handlers": ["console"], "level": "INFO", "propagate": False},
+    },
+}
+
 CELERY_TASK_TRACK_STARTED = True
 CELERY_TASK_TIME_LIMIT = 30 * 60
 CELERY_BROKER_URL = f"sqla+sqlite:///{os.path.join(BASE_DIR, '.var/celerydb.sqlite')}"
@@ -166,6 +192,21 @@ CELERY_BEAT_SCHEDULE = {
         "task": "articles.tasks.fetch_guardian_articles",
         "schedule": crontab(minute="*/30"),
     },
+    "refresh-edited-guardian-articles-periodically": {
+        "task": "articles.tasks.fetch_guardian_articles",
+        "schedule": crontab(minute=15),
+        "kwargs": {"upsert": True},
+    },
+    # Retries articles whose chunk/embed task failed or whose worker crashed
+    # (once their lease has expired)
+    "drain-embedding-backlog-periodically": {
+        "task": "articles.tasks.drain_embedding_backlog",
+        "schedule": crontab(minute="*/15"),
+    },
+    "migrate-embeddings-periodically": {
+        "task": "articles.tasks.migrate_embeddings",
+        "schedule": crontab(minute="*"),
+    },
 }
 
 # CORS Configuration
@@ -187,5 +228,78 @@ CSRF_COOKIE_SAMESITE = 'Lax'
 SESSION_COOKIE_HTTPONLY = True
 CSRF_COOKIE_HTTPONLY = False
 
-# Allowed values: "OLLAMA", "OPENROUTER"
+# Allowed values: "OLLAMA", "OPENROUTER", "LOCAL" (in-process, CPU)
 EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "OLLAMA")
+# Model name for the backend, defaults to the Qwen3 0.6B embedding model. Only
+# used to bootstrap the embedding version: change models with migrate_embeddings
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "")
+# Articles re-embedded into the target slot per minute during a migration
+EMBEDDING_MIGRATION_RATE = int(os.getenv("EMBEDDING_MIGRATION_RATE", "500"))
+# Seconds a process keeps the active embedding version before re-reading it
+EMBEDDING_VERSION_TTL = float(os.getenv("EMBEDDING_VERSION_TTL", "10"))
+# LOCAL backend: concurrent requests are coalesced into batches of up to
+# EMBEDDING_LOCAL_BATCH_SIZE texts, waiting at most EMBEDDING_LOCAL_BATCH_WAIT seconds
+EMBEDDING_LOCAL_BATCH_SIZE = int(os.getenv("EMBEDDING_LOCAL_BATCH_SIZE", "32"))
+EMBEDDING_LOCAL_BATCH_WAIT = float(os.getenv("EMBEDDING_LOCAL_BATCH_WAIT", "0.005"))
+EMBEDDING_LOCAL_QUANTIZE = os.getenv("EMBEDDING_LOCAL_QUANTIZE", "false").lower() == "true"  # int8 dynamic quantization
+EMBEDDING_LOCAL_THREADS = int(os.getenv("EMBEDDING_LOCAL_THREADS", "0")) or None  # torch threads, default all cores
+# Embedding service (manage.py embedding_server) shared by all processes on
+# the host, e.g. "unix:///tmp/newsaic-embeddings.sock" or "http://127.0.0.1:8765".
+# It coalesces concurrent requests arriving within EMBEDDING_SERVICE_BATCH_WAIT
+# seconds into batches of up to EMBEDDING_BATCH_MAX_INPUTS texts
+EMBEDDING_SERVICE_URL = os.getenv("EMBEDDING_SERVICE_URL", "")
+EMBEDDING_SERVICE_BATCH_WAIT = float(os.getenv("EMBEDDING_SERVICE_BATCH_WAIT", "0.005"))
+EMBEDDING_SERVICE_TIMEOUT = float(os.getenv("EMBEDDING_SERVICE_TIMEOUT", "60"))
+# Article embeddings are the length-weighted mean of their chunk embeddings
+# instead of a separate embedding of the whole body. Off by default: articles
+# embedded before keep their whole-body embedding in the same index
+EMBEDDING_POOL_CHUNKS = os.getenv("EMBEDDING_POOL_CHUNKS", "false").lower() == "true"
+# Batches waiting between two stages of the chunk/embedding pipeline
+EMBEDDING_PIPELINE_QUEUE_SIZE = int(os.getenv("EMBEDDING_PIPELINE_QUEUE_SIZE", "2"))
+# Processes splitting article bodies into chunks; 0 or 1 splits in the
+# embedding process itself. Each Celery worker process starts its own pool
+EMBEDDING_CHUNK_WORKERS = int(os.getenv("EMBEDDING_CHUNK_WORKERS", "0"))
+# Chunks whose text (or one with a shingle Jaccard similarity of at least
+# EMBEDDING_NEAR_DUPLICATE_THRESHOLD) is already stored share its embedding;
+# texts found in EMBEDDING_BOILERPLATE_MIN_ARTICLES articles are not embedded
+EMBEDDING_DEDUPE_CHUNKS = os.getenv("EMBEDDING_DEDUPE_CHUNKS", "true").lower() == "true"
+EMBEDDING_NEAR_DUPLICATE_THRESHOLD = float(os.getenv("EMBEDDING_NEAR_DUPLICATE_THRESHOLD", "0.9"))
+EMBEDDING_BOILERPLATE_MIN_ARTICLES = int(os.getenv("EMBEDDING_BOILERPLATE_MIN_ARTICLES", "5"))
+# Workers lease the batches of articles they chunk or embed; a lease not
+# released within this many seconds (crashed worker, failed batch) expires
+# and the articles are retried
+EMBEDDING_LEASE_SECONDS = int(os.getenv("EMBEDDING_LEASE_SECONDS", "900"))
+# Vector search first retrieves EMBEDDING_RESCORE_OVERSAMPLE times the wanted
+# results from an index of truncated (Matryoshka) embeddings, then rescores
+# them against the full 1024-dim vectors (see articles.models.SMALL_DIMENSIONS).
+EMBEDDING_RESCORE = os.getenv("EMBEDDING_RESCORE", "true").lower() == "true"
+EMBEDDING_RESCORE_OVERSAMPLE = int(os.getenv("EMBEDDING_RESCORE_OVERSAMPLE", "4"))
+# Inputs are sent in batches of at most this many tokens / inputs,
+# with up to EMBEDDING_MAX_CONCURRENCY batches in flight
+EMBEDDING_BATCH_TOKENS = int(os.getenv("EMBEDDING_BATCH_TOKENS", "8192"))
+EMBEDDING_BATCH_MAX_INPUTS = int(os.getenv("EMBEDDING_BATCH_MAX_INPUTS", "64"))
+EMBEDDING_MAX_CONCURRENCY = int(os.getenv("EMBEDDING_MAX_CONCURRENCY", "4"))
+# Embeddings are cached in Mongo by (model, text hash); least recently used
+# entries beyond the cap are evicted (~8 KB each at 1024 dimensions)
+EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "200000"))
+# Search/QA query embeddings: per-process LRU with a TTL (seconds),
+# optionally backed by the "shared" cache
+EMBEDDING_QUERY_CACHE_SIZE = int(os.getenv("EMBEDDING_QUERY_CACHE_SIZE", "1024"))
+EMBEDDING_QUERY_CACHE_TTL = int(os.getenv("EMBEDDING_QUERY_CACHE_TTL", "3600"))
+EMBEDDING_QUERY_SHARED_CACHE = os.getenv("EMBEDDING_QUERY_SHARED_CACHE", "true").lower() == "true"
+
+# Guardian API quota: developer keys allow 1 call per second.
+GUARDIAN_RATE_LIMIT = float(os.getenv("GUARDIAN_RATE_LIMIT", "1"))  # requests per second
+GUARDIAN_RATE_BURST = int(os.getenv("GUARDIAN_RATE_BURST", "1"))
+GUARDIAN_MAX_CONCURRENCY = int(os.getenv("GUARDIAN_MAX_CONCURRENCY", "4"))
+# Retries on 429/5xx, with jittered exponential backoff (seconds)
+GUARDIAN_MAX_RETRIES = int(os.getenv("GUARDIAN_MAX_RETRIES", "5"))
+GUARDIAN_BACKOFF_BASE = 1.0
+GUARDIAN_BACKOFF_MAX = 60.0
+# Decode /search results one at a time while the response streams in
+GUARDIAN_STREAM_RESPONSES = os.getenv("GUARDIAN_STREAM_RESPONSES", "true").lower() == "true"
+# Serve Guardian API calls from recorded fixtures instead (see benchmark_ingest)
+GUARDIAN_REPLAY_DIR = os.getenv("GUARDIAN_REPLAY_DIR")
+GUARDIAN_REPLAY_LATENCY = float(os.getenv("GUARDIAN_REPLAY_LATENCY", "0"))  # seconds per request
+GUARDIAN_REPLAY_RATE_LIMIT_RATIO = float(os.getenv("GUARDIAN_REPLAY_RATE_LIMIT_RATIO", "0"))  # share of 429s
@@ -1,6 +1,6 @@
 from rest_framework import serializers
 from .models import User, UserType, Bookmark, AuthorPersona, SectionPreference
-from articles.models import Section
+from articles.cache import get_sections_map
 from articles.serializers import ArticleSerializer
 from django.contrib.auth.password_validation import validate_password
 from django.core.exceptions import ValidationError as DjangoValidationError
@@ -34,11 +34,7 @@ class SectionPreferenceListSerializer(serializers.ListSerializer):
         if len(section_ids) != len(unique_section_ids):
             raise serializers.ValidationError("Duplicate section_ids are not allowed.")
 
-        found_sections = Section.objects.filter(
-            section_id__in=unique_section_ids
-        ).count()
-
-        if found_sections != len(unique_section_ids):
+        if not unique_section_ids <= get_sections_map().keys():
             raise serializers.ValidationError(
                 "One or more provided section_ids do not exist."
             )
@@ -47,11 +43,7 @@ class SectionPreferenceListSerializer(serializers.ListSerializer):
 
     def create(self, validated_data):
 
-        section_ids = [item['section_id'] for item in validated_data]
-
-        sections = Section.objects.filter(section_id__in=section_ids)
-
-        sections_map = {s.section_id: s for s in sections}
+        sections_map = get_sections_map()
 
         created_sections = []
         for item in validated_data:
@@ -64,10 +56,7 @@ class SectionPreferenceListSerializer(serializers.ListSerializer):
 
         existing_sections_map = {s.section_id: s for s in instance}
 
-        incoming_section_ids = [item['section_id'] for item in validated_data]
-
-        sections = Section.objects.filter(section_id__in=incoming_section_ids)
-        sections_map = {s.section_id: s for s in sections}
+        sections_map = get_sections_map()
 
         updated_sections = []
         for item in validated_data:
@@ -0,0 +1,58 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable
+
+
+class MicroBatcher:
+    """
+    Coalesces texts submitted by concurrent threads into batches: a single
+    thread takes whatever is queued, waiting at most `batch_wait` seconds
+    from the first text for more, and passes up to `batch_size` texts to
+    `embed_fn` at once.
+    """
+
+    def __init__(self, embed_fn: Callable[[list[str]], list], batch_size: int, batch_wait: float, name: str = "micro-batcher"):
+        self.embed_fn = embed_fn
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self.batches = 0
+        self.texts = 0
+        self._queue = queue.Queue()
+        self._worker = threading.Thread(target=self._run, name=name, daemon=True)
+        self._worker.start()
+
+    def embed(self, inputs: list[str]) -> list:
+        futures = []
+        for text in inputs:
+            future = Future()
+            self._queue.put((text, future))
+            futures.append(future)
+        return [future.result() for future in futures]
+
+    def _next_batch(self) -> list:
+        batch = [self._queue.get()]
+        # The wait starts with the first text, not afresh for every text
+        deadline = time.monotonic() + self.batch_wait
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            try:
+                embeddings = self.embed_fn([text for text, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            self.batches += 1
+            self.texts += len(batch)
+            for (_, future), embedding in zip(batch, embeddings):
+                future.set_result(embedding)
@@ -0,0 +1,191 @@
+import http.client
+import json
+import logging
+import socket
+import socketserver
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable
+from urllib.parse import urlsplit
+import numpy as np
+from utils.batching import MicroBatcher
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingServiceError(Exception):
+    """
+    The service is unreachable or failed to answer with embeddings: the
+    caller should embed in-process instead.
+    """
+
+
+class ModelMismatch(EmbeddingServiceError):
+    """
+    The service does not embed with the model requested.
+    """
+
+
+class ModelBatchers:
+    """
+    One MicroBatcher per model served, made by `make_batcher(model)` on the
+    first request for it (which raises ValueError for a model that can't
+    be served), so that both models of a migration share the service.
+    """
+
+    def __init__(self, make_batcher: Callable[[str], MicroBatcher]):
+        self.make_batcher = make_batcher
+        self._batchers = {}
+        self._lock = threading.Lock()
+
+    def get(self, model: str) -> MicroBatcher:
+        with self._lock:
+            if model not in self._batchers:
+                self._batchers[model] = self.make_batcher(model)
+            return self._batchers[model]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                model: {
+                    "batches": batcher.batches,
+                    "texts": batcher.texts,
+                    "texts_per_batch": batcher.texts / batcher.batches if batcher.batches else 0.0,
+                }
+                for model, batcher in self._batchers.items()
+            }
+
+
+class EmbeddingRequestHandler(BaseHTTPRequestHandler):
+    """
+    POST /embed with {"inputs": [...], "model": "..."} answers the embeddings
+    as packed little-endian float32 rows (X-Dimensions header gives the row
+    length, X-Model the model), or 409 if the model can't be served.
+    GET /health answers the batching counters of each model served.
+    """
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        if self.path != "/health":
+            self.send_error(404)
+            return
+        self.send_body(json.dumps({"models": self.server.batchers.stats()}).encode(), "application/json")
+
+    def do_POST(self):
+        if self.path != "/embed":
+            self.send_error(404)
+            return
+        try:
+            request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            model = request["model"]
+            try:
+                batcher = self.server.batchers.get(model)
+            except ValueError as e:
+                logger.warning(f"Refused request: {e}")
+                self.send_body(b"", "application/octet-stream", status=409)
+                return
+            embeddings = np.asarray(batcher.embed(request["inputs"]), dtype="<f4")
+        except Exception as e:
+            logger.error(f"Error embedding request: {e}")
+            self.send_error(500, str(e))
+            return
+        self.send_body(
+            embeddings.tobytes(),
+            "application/octet-stream",
+            {"X-Dimensions": str(embeddings.shape[1] if embeddings.ndim == 2 else 0), "X-Model": model},
+        )
+
+    def send_body(self, body: bytes, content_type: str, headers: dict | None = None, status: int = 200):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+
+class ThreadingUnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def make_server(url: str, batchers: ModelBatchers):
+    """
+    Server for `url` (http://127.0.0.1:PORT or unix:///path/to/socket).
+    """
+    parts = urlsplit(url)
+    if parts.scheme == "unix":
+        server = ThreadingUnixHTTPServer(parts.path, EmbeddingRequestHandler)
+    elif parts.scheme == "http":
+        server = ThreadingHTTPServer((parts.hostname, parts.port), EmbeddingRequestHandler)
+    else:
+        raise ValueError(f"Unsupported EMBEDDING_SERVICE_URL: {url}")
+    server.batchers = batchers
+    return server
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path: str, timeout: float):
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+
+class EmbeddingServiceClient:
+    """
+    Client of the embedding service, keeping one connection per thread.
+    """
+
+    def __init__(self, url: str, timeout: float):
+        self.url = url
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self) -> http.client.HTTPConnection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            parts = urlsplit(self.url)
+            if parts.scheme == "unix":
+                connection = UnixHTTPConnection(parts.path, self.timeout)
+            else:
+                connection = http.client.HTTPConnection(parts.hostname, parts.port, timeout=self.timeout)
+            self._local.connection = connection
+        return connection
+
+    def embed(self, inputs: list[str], model: str) -> list[np.ndarray]:
+        """
+        Embed `inputs` with `model`. Raises ModelMismatch if the service
+        can't serve it, or answers with another model's vectors, and
+        EmbeddingServiceError on any other failure.
+        """
+        body = json.dumps({"inputs": inputs, "model": model}).encode()
+        for attempt in range(2):
+            connection = self._connection()
+            try:
+                connection.request("POST", "/embed", body, {"Content-Type": "application/json"})
+                response = connection.getresponse()
+                data = response.read()
+                break
+            except (OSError, http.client.HTTPException) as e:
+                # Stale keep-alive connection or service restarted: reconnect once
+                connection.close()
+                self._local.connection = None
+                if attempt:
+                    raise EmbeddingServiceError(f"Embedding service unreachable: {e}") from e
+        served = response.headers.get("X-Model")
+        if response.status == 409 or (response.status == 200 and served != model):
+            raise ModelMismatch(f"Embedding service does not serve {model}" + (f" (answered {served})" if served else ""))
+        if response.status != 200:
+            raise EmbeddingServiceError(f"Embedding service error {response.status}: {response.reason}")
+        try:
+            dimensions = int(response.headers["X-Dimensions"])
+            return list(np.frombuffer(data, dtype="<f4").reshape(len(inputs), dimensions))
+        except (KeyError, ValueError) as e:
+            raise EmbeddingServiceError(f"Malformed embedding service answer: {e}") from e
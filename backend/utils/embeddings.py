@@ -1,22 +1,365 @@
+import functools
+import hashlib
+import logging
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 import ollama
-from newsaic.settings import EMBEDDING_BACKEND
+import tiktoken
+from django.db import IntegrityError, connection
+from django.utils import timezone
+from newsaic.settings import (
+    EMBEDDING_BACKEND,
+    EMBEDDING_BATCH_MAX_INPUTS,
+    EMBEDDING_BATCH_TOKENS,
+    EMBEDDING_CACHE_ENABLED,
+    EMBEDDING_CACHE_MAX_ENTRIES,
+    EMBEDDING_MAX_CONCURRENCY,
+    EMBEDDING_MODEL,
+    EMBEDDING_QUERY_CACHE_SIZE,
+    EMBEDDING_QUERY_CACHE_TTL,
+    EMBEDDING_QUERY_SHARED_CACHE,
+    EMBEDDING_SERVICE_TIMEOUT,
+    EMBEDDING_SERVICE_URL,
+)
 from openai import OpenAI
 import os
+from utils import local_embeddings
+from utils.embedding_service import EmbeddingServiceClient, EmbeddingServiceError
+from articles.cache import shared_cache
+from articles.models import SMALL_DIMENSIONS, EmbeddingCacheEntry
 
-def embed(inputs: list[str]) -> list[list[float]]:
+logger = logging.getLogger(__name__)
 
+MODELS = {
+    'openrouter': "qwen/qwen3-embedding-0.6b",
+    'ollama': "qwen3-embedding:0.6B",
+    'local': local_embeddings.LOCAL_MODEL,
+}
+
+# Same encoding as the chunk splitter (articles.embedding), so batch budgets
+# and chunk sizes are counted in the same tokens
+TOKEN_ENCODING = "gpt2"
+
+
+@functools.cache
+def get_encoding():
+    return tiktoken.get_encoding(TOKEN_ENCODING)
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(backend: str):
+    """
+    Long-lived client per backend, so HTTP connections are pooled and reused
+    across calls. Both clients are safe to share between threads.
+    """
+    with _clients_lock:
+        if backend not in _clients:
+            if backend == 'openrouter':
+                _clients[backend] = OpenAI(
+                    base_url="https://openrouter.ai/api/v1",
+                    api_key=os.getenv("OPENROUTER_API_KEY"),
+                )
+            elif backend == 'ollama':
+                _clients[backend] = ollama.Client()
+            elif backend == 'local':
+                _clients[backend] = local_embeddings
+            else:
+                raise ValueError(f"Unknown embedding backend: {backend}")
+        return _clients[backend]
+
+
+def split_batches(inputs: list[str]) -> list[list[int]]:
+    """
+    Group input indices into consecutive batches of at most
+    EMBEDDING_BATCH_TOKENS tokens and EMBEDDING_BATCH_MAX_INPUTS inputs.
+    An input larger than the budget gets a batch of its own.
+    """
+    batches = []
+    batch, batch_tokens = [], 0
+    for i, tokens in enumerate(len(t) for t in get_encoding().encode_ordinary_batch(inputs)):
+        if batch and (
+            batch_tokens + tokens > EMBEDDING_BATCH_TOKENS or len(batch) >= EMBEDDING_BATCH_MAX_INPUTS
+        ):
+            batches.append(batch)
+            batch, batch_tokens = [], 0
+        batch.append(i)
+        batch_tokens += tokens
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def model_id() -> str:
+    """
+    The configured model, as "backend:model name". Vectors are tagged with
+    the id of the model that produced them. Only the initial model of the
+    embedding version: use default_model() to embed.
+    """
     backend = EMBEDDING_BACKEND.lower()
+    if backend not in MODELS:
+        raise ValueError(f"Unknown EMBEDDING_BACKEND: {EMBEDDING_BACKEND}")
+    return f"{backend}:{EMBEDDING_MODEL or MODELS[backend]}"
+
+
+def default_model() -> str:
+    """
+    The model search currently reads, i.e. the active one of the embedding
+    version (see articles.vectors), which a migration changes.
+    """
+    # articles.vectors imports this module
+    from articles.vectors import current_version
+    return current_version().active_model
+
+
+def split_model_id(model: str) -> tuple[str, str]:
+    backend, _, name = model.partition(":")
+    if backend not in MODELS or not name:
+        raise ValueError(f"Unknown embedding model: {model}")
+    return backend, name
+
+
+def normalize(text: str) -> str:
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFC", text)).strip()
+
+
+def truncate_embedding(embedding, dimensions: int = SMALL_DIMENSIONS) -> np.ndarray:
+    """
+    Matryoshka truncation: the re-normalized first `dimensions` components.
+    """
+    prefix = np.asarray(embedding, dtype=np.float32)[:dimensions]
+    norm = np.linalg.norm(prefix)
+    return prefix / norm if norm else prefix
+
+
+def cache_key(model: str, text: str) -> str:
+    return hashlib.sha256(f"{model}\0{normalize(text)}".encode()).hexdigest()
+
+
+def embed_batch(inputs: list[str], model: str) -> list[list[float]]:
+
+    backend, name = split_model_id(model)
+    client = get_client(backend)
     if backend == 'openrouter':
-        client = OpenAI(
-            base_url="https://openrouter.ai/api/v1",
-            api_key=os.getenv("OPENROUTER_API_KEY"),
-        )
         response = client.embeddings.create(
-            model="qwen/qwen3-embedding-0.6b",
+            model=name,
             input=inputs
         )
-        return [data.embedding for data in response.data]
+        # Results carry their input index, don't rely on their order
+        return [data.embedding for data in sorted(response.data, key=lambda d: d.index)]
     elif backend == 'ollama':
-        return ollama.embed("qwen3-embedding:0.6B", inputs)["embeddings"]
+        return client.embed(name, inputs)["embeddings"]
+    elif backend == 'local':
+        return client.get_embedder(name).embed(inputs)
     else:
-        raise ValueError(f"Unknown EMBEDDING_BACKEND: {EMBEDDING_BACKEND}")
\ No newline at end of file
+        raise ValueError(f"Unknown embedding backend: {backend}")
+
+
+service_client = EmbeddingServiceClient(EMBEDDING_SERVICE_URL, EMBEDDING_SERVICE_TIMEOUT) if EMBEDDING_SERVICE_URL else None
+
+
+def embed_uncached(inputs: list[str], model: str | None = None) -> list[list[float]]:
+    """
+    Embed `inputs` with `model` (default: the active one), through the
+    embedding service when EMBEDDING_SERVICE_URL is set (falling back to the
+    backend if it is unreachable, fails or can't serve that model), otherwise with
+    the backend directly. Output order matches `inputs`.
+    """
+    if not inputs:
+        return []
+    model = model or default_model()
+    if service_client is not None:
+        try:
+            return service_client.embed(inputs, model)
+        except EmbeddingServiceError as e:
+            logger.warning(f"{e}, embedding in-process")
+    return embed_backend(inputs, model)
+
+
+def embed_backend(inputs: list[str], model: str | None = None) -> list[list[float]]:
+    """
+    Embed `inputs` in token-bounded batches, sending up to
+    EMBEDDING_MAX_CONCURRENCY batches at once. Output order matches `inputs`.
+    """
+    if not inputs:
+        return []
+    model = model or default_model()
+
+    batches = split_batches(inputs)
+    if len(batches) == 1:
+        return embed_batch(inputs, model)
+
+    logger.info(f"Embedding {len(inputs)} inputs in {len(batches)} batches")
+    with ThreadPoolExecutor(max_workers=min(EMBEDDING_MAX_CONCURRENCY, len(batches))) as executor:
+        results = executor.map(lambda batch: embed_batch([inputs[i] for i in batch], model), batches)
+        # map() yields in submission order and the batches are consecutive
+        return [embedding for batch_embeddings in results for embedding in batch_embeddings]
+
+
+def embed(inputs: list[str], model: str | None = None) -> list[list[float]]:
+    """
+    Embed `inputs` with `model` (default: the active one), reusing cached
+    embeddings of identical (normalized) texts. Only texts missing from the
+    cache are sent to the backend, once each.
+    """
+    model = model or default_model()
+    if not EMBEDDING_CACHE_ENABLED or not inputs:
+        return embed_uncached(inputs, model)
+
+    keys = [cache_key(model, text) for text in inputs]
+
+    cached = dict(
+        EmbeddingCacheEntry.objects.filter(key__in=set(keys)).values_list("key", "embedding")
+    )
+    if cached:
+        EmbeddingCacheEntry.objects.filter(key__in=cached.keys()).update(last_used_at=timezone.now())
+
+    # Duplicate texts within the batch are embedded only once
+    misses = {}
+    for key, text in zip(keys, inputs):
+        if key not in cached and key not in misses:
+            misses[key] = text
+
+    logger.info(f"Embedding cache: {len(inputs) - len(misses)} hits, {len(misses)} misses")
+
+    if misses:
+        computed = dict(zip(misses.keys(), embed_uncached(list(misses.values()), model)))
+        store(model, computed)
+        cached |= computed
+
+    return [cached[key] for key in keys]
+
+
+def store(model: str, embeddings: dict[str, list[float]]):
+    entries = [
+        EmbeddingCacheEntry(key=key, model=model, embedding=embedding)
+        for key, embedding in embeddings.items()
+    ]
+    try:
+        EmbeddingCacheEntry.objects.bulk_create(entries)
+    except IntegrityError:
+        # Another worker cached some of these texts meanwhile, keep theirs
+        existing = set(
+            EmbeddingCacheEntry.objects.filter(key__in=embeddings.keys()).values_list("key", flat=True)
+        )
+        for entry in entries:
+            if entry.key not in existing:
+                try:
+                    entry.save(force_insert=True)
+                except IntegrityError:
+                    pass
+    evict()
+
+
+def evict():
+    """
+    Delete the least recently used entries beyond EMBEDDING_CACHE_MAX_ENTRIES.
+    The size comes from the collection metadata: an exact count() would scan
+    the collection on every store.
+    """
+    collection = connection.get_collection(EmbeddingCacheEntry._meta.db_table)
+    excess = collection.estimated_document_count() - EMBEDDING_CACHE_MAX_ENTRIES
+    if excess <= 0:
+        return
+    stale = list(
+        EmbeddingCacheEntry.objects.order_by("last_used_at").values_list("pk", flat=True)[:excess]
+    )
+    EmbeddingCacheEntry.objects.filter(pk__in=stale).delete()
+    logger.info(f"Evicted {len(stale)} entries from the embedding cache")
+
+
+class QueryEmbeddingCache:
+    """
+    In-process LRU cache of query embeddings with a TTL, in front of the
+    optional "shared" cache tier so that processes also reuse each other's
+    query embeddings. Keeps hit counters for the stats endpoint.
+    """
+
+    def __init__(self, max_size: int, ttl: float, use_shared: bool = True):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.use_shared = use_shared
+        self._entries = OrderedDict()  # key -> (expires_at, embedding)
+        self._lock = threading.Lock()
+        self.local_hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+
+    def key(self, query: str, model: str) -> str:
+        return "query-embedding:" + cache_key(model, normalize(query).casefold())
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, embedding = entry
+                if expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.local_hits += 1
+                    return embedding
+                del self._entries[key]
+
+        if self.use_shared:
+            embedding = shared_cache().get(key)
+            if embedding is not None:
+                self._store_local(key, embedding)
+                with self._lock:
+                    self.shared_hits += 1
+                return embedding
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, key: str, embedding: list[float]):
+        self._store_local(key, embedding)
+        if self.use_shared:
+            shared_cache().set(key, embedding, timeout=self.ttl)
+
+    def _store_local(self, key: str, embedding: list[float]):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, embedding)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.local_hits + self.shared_hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl": self.ttl,
+                "local_hits": self.local_hits,
+                "shared_hits": self.shared_hits,
+                "misses": self.misses,
+                "hit_rate": (self.local_hits + self.shared_hits) / lookups if lookups else 0.0,
+            }
+
+
+query_cache = QueryEmbeddingCache(
+    max_size=EMBEDDING_QUERY_CACHE_SIZE,
+    ttl=EMBEDDING_QUERY_CACHE_TTL,
+    use_shared=EMBEDDING_QUERY_SHARED_CACHE,
+)
+
+
+def embed_query(query: str, model: str | None = None) -> list[float]:
+    """
+    Embed a search or QA query with `model` (default: the active one),
+    served from query_cache when it was seen recently.
+    """
+    model = model or default_model()
+    key = query_cache.key(query, model)
+    embedding = query_cache.get(key)
+    if embedding is None:
+        embedding = embed_uncached([query], model)[0]
+        query_cache.set(key, embedding)
+    return embedding
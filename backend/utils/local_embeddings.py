@@ -0,0 +1,96 @@
+import functools
+import logging
+import threading
+from newsaic.settings import (
+    EMBEDDING_LOCAL_BATCH_SIZE,
+    EMBEDDING_LOCAL_BATCH_WAIT,
+    EMBEDDING_LOCAL_QUANTIZE,
+    EMBEDDING_LOCAL_THREADS,
+)
+from utils.batching import MicroBatcher
+
+logger = logging.getLogger(__name__)
+
+LOCAL_MODEL = "Qwen/Qwen3-Embedding-0.6B"
+
+
+class LocalEmbedder:
+    """
+    Runs the embedding model in-process on CPU.
+
+    The model is loaded on first use, once per process (so once per Celery
+    worker or web worker). Requests from concurrent threads are coalesced
+    by a MicroBatcher into forward passes of up to `batch_size` texts,
+    waiting at most `batch_wait` seconds for more. With `quantize`, Linear
+    layers are dynamically quantized to int8.
+    """
+
+    def __init__(self, model_name: str, batch_size: int, batch_wait: float, quantize: bool, threads: int | None):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self.quantize = quantize
+        self.threads = threads
+        self._model = None
+        self._batcher = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        # Optional dependencies, only needed with EMBEDDING_BACKEND=LOCAL
+        import torch
+        from sentence_transformers import SentenceTransformer
+
+        if self.threads:
+            torch.set_num_threads(self.threads)
+        model = SentenceTransformer(self.model_name, device="cpu")
+        if self.quantize:
+            model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        model.eval()
+        logger.info(f"Loaded {self.model_name} on CPU (int8: {self.quantize})")
+        return model
+
+    def _get_model(self):
+        with self._lock:
+            if self._model is None:
+                self._model = self._load()
+            return self._model
+
+    def _start(self):
+        self._get_model()
+        with self._lock:
+            if self._batcher is None:
+                self._batcher = MicroBatcher(self.encode, self.batch_size, self.batch_wait, name="local-embedder")
+
+    def encode(self, texts: list[str]) -> list[list[float]]:
+        """
+        Encode `texts` in one forward pass, without coalescing them with
+        other threads' texts: for callers that batch themselves.
+        """
+        embeddings = self._get_model().encode(
+            texts,
+            batch_size=len(texts),
+            normalize_embeddings=True,
+            convert_to_numpy=True,
+        )
+        return [embedding.tolist() for embedding in embeddings]
+
+    def embed(self, inputs: list[str]) -> list[list[float]]:
+        if not inputs:
+            return []
+        self._start()
+        return self._batcher.embed(inputs)
+
+
+@functools.cache
+def get_embedder(model_name: str = LOCAL_MODEL) -> LocalEmbedder:
+    """
+    The process-wide embedder of `model_name`; the model itself is loaded
+    on first use.
+    """
+    return LocalEmbedder(
+        model_name,
+        batch_size=EMBEDDING_LOCAL_BATCH_SIZE,
+        batch_wait=EMBEDDING_LOCAL_BATCH_WAIT,
+        quantize=EMBEDDING_LOCAL_QUANTIZE,
+        threads=EMBEDDING_LOCAL_THREADS,
+    )